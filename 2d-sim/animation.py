@@ -0,0 +1,199 @@
+'''
+Streaming animation output.
+
+Frames are encoded one at a time (optionally in worker processes) and appended to
+the file as they arrive, so memory stays bounded by the frames in flight instead
+of growing with the length of the animation. GifStreamWriter produces an animated
+GIF, FrameArchive keeps the raw frames in a memory-mapped .npy file.
+'''
+
+import os
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image, GifImagePlugin
+
+# =========================================================
+# Frame encoding
+# =========================================================
+
+def to_image(frame):
+    """
+    Accept a PIL image or an (H, W, 3|4) uint8 array and return an RGB image.
+    """
+    if isinstance(frame, Image.Image):
+        return frame.convert("RGB")
+    return Image.fromarray(np.asarray(frame, dtype=np.uint8)).convert("RGB")
+
+def encode_frame(frame, duration, scale=None, size=None):
+    """
+    Encode one frame as a self-contained GIF image block with its own palette.
+
+    scale  : optional downscaling factor (0.5 halves width and height)
+    size   : optional (width, height) the frame is resized to, applied after scale
+
+    Returns ((width, height), bytes).
+    """
+    im = to_image(frame)
+    if scale is not None and scale != 1:
+        w, h = im.size
+        im = im.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.LANCZOS)
+    if size is not None and im.size != tuple(size):
+        im = im.resize(tuple(size), Image.LANCZOS)
+
+    paletted = im.quantize(colors=256)
+    data = GifImagePlugin.getdata(paletted, duration=duration, include_color_table=True)
+    return im.size, b"".join(data)
+
+def encode_file(path, duration, scale=None, size=None):
+    """
+    encode_frame for an image on disk; opens (and decodes) only this one file.
+    """
+    with Image.open(path) as im:
+        return encode_frame(im, duration, scale, size)
+
+# =========================================================
+# Writer
+# =========================================================
+
+class GifStreamWriter:
+    """
+    Append-only animated GIF writer.
+
+    The logical screen size is taken from the first frame; later frames must
+    have the same size. Frames can be passed as images/arrays (append) or as
+    blocks already produced by encode_frame (append_encoded).
+    """
+
+    def __init__(self, filename, duration=100, loop=0):
+        self.filename = filename
+        self.duration = duration
+        self.loop     = loop
+        self.size     = None
+        self.frames   = 0
+        self.f        = open(filename, "wb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __write_header(self, size):
+        w, h = size
+        # no global color table: every frame carries its own palette
+        self.f.write(b"GIF89a" + struct.pack("<HHBBB", w, h, 0, 0, 0))
+        # NETSCAPE2.0 application extension: loop count
+        self.f.write(b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", self.loop) + b"\x00")
+        self.size = (w, h)
+
+    def append_encoded(self, size, data):
+        if self.size is None:
+            self.__write_header(size)
+        elif tuple(size) != self.size:
+            raise ValueError(f"Frame size {tuple(size)} does not match animation size {self.size}.")
+        self.f.write(data)
+        self.frames += 1
+        return
+
+    def append(self, frame, scale=None):
+        size, data = encode_frame(frame, self.duration, scale, self.size)
+        self.append_encoded(size, data)
+        return
+
+    def close(self):
+        if self.f.closed:
+            return
+        if self.size is not None:
+            self.f.write(b";")
+        self.f.close()
+        return
+
+class FrameArchive:
+    """
+    Raw RGB frames appended to a preallocated .npy file (frames, H, W, 3).
+    Nothing is encoded; the archive can be memory-mapped with np.load(mmap_mode="r").
+    """
+
+    def __init__(self, filename, frames):
+        self.filename = filename
+        self.capacity = frames
+        self.size     = None
+        self.frames   = 0
+        self.data     = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def append(self, frame, scale=None):
+        im = to_image(frame)
+        if scale is not None and scale != 1:
+            w, h = im.size
+            im = im.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.LANCZOS)
+        if self.data is None:
+            self.size = im.size
+            w, h = self.size
+            self.data = np.lib.format.open_memmap(self.filename, mode="w+", dtype=np.uint8,
+                                                  shape=(self.capacity, h, w, 3))
+        elif im.size != self.size:
+            im = im.resize(self.size, Image.LANCZOS)
+        if self.frames >= self.capacity:
+            raise ValueError(f"Frame archive {self.filename} is full ({self.capacity} frames).")
+
+        self.data[self.frames] = np.asarray(im)
+        self.frames += 1
+        return
+
+    def close(self):
+        if self.data is not None:
+            self.data.flush()
+            self.data = None
+        return
+
+# =========================================================
+# Parallel, ordered frame production
+# =========================================================
+
+def ordered_map(fn, items, workers=None, window=None):
+    """
+    Like map(fn, items) but evaluated in a process pool.
+
+    Results are yielded in input order and at most `window` tasks are in
+    flight at any time, which bounds memory to a small number of frames.
+    workers=1 runs everything in the current process.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if window is None:
+        window = 2 * workers
+
+    if workers <= 1:
+        for item in items:
+            yield fn(*item)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(fn, *item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    return
+
+def write_gif(filename, fn, items, duration, workers=None, window=None, loop=0):
+    """
+    Build an animated GIF from encode tasks.
+    `fn(*item)` must return ((width, height), bytes) as encode_frame does.
+    """
+    with GifStreamWriter(filename, duration, loop) as writer:
+        for size, data in ordered_map(fn, items, workers, window):
+            writer.append_encoded(size, data)
+    return writer.frames
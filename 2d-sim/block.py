@@ -1,5 +1,6 @@
 import random
 import numpy as np
+from counter_rng import INIT, PERTURB, REFINE
 
 class Block:
     """
@@ -12,23 +13,35 @@ class Block:
     [b2|b3]
     """
 
-    def __init__(self, sim, xmin, xmax, ymin, ymax, level=0):
+    def __init__(self, sim, xmin, xmax, ymin, ymax, level=0, values=None):
+        self.sim = sim
+        self.reset(xmin, xmax, ymin, ymax, level, values)
+        return
+
+    def reset(self, xmin, xmax, ymin, ymax, level=0, values=None):
+        """
+        (Re)initialize the block as a fresh leaf. Without `values` the corners are
+        drawn at random; BlockPool passes values to skip draws refine overwrites.
+        """
         self.active = True
-        self.sim    = sim
         self.xmin   = xmin
         self.xmax   = xmax
         self.ymin   = ymin
         self.ymax   = ymax
 
-        self.x1 = self.sim.rng.uniform(0, 1)
-        self.x2 = self.sim.rng.uniform(0, 1)
-        self.x3 = self.sim.rng.uniform(0, 1)
-        self.x4 = self.sim.rng.uniform(0, 1)
-
         self.children = []
         self.level = level
         self.parent = None
 
+        if values is None:
+            values = self.sim.block_rng.uniform4(self, INIT, (0, 0, 0, 0), (1, 1, 1, 1))
+        self.x1, self.x2, self.x3, self.x4 = values
+
+        # Dirty tracking: values changed since the last dump, and where the
+        # block was written in that dump (-1 if it was not a leaf then)
+        self.dirty = True
+        self.dump_offset = -1
+
         return
     
     def center(self):
@@ -36,6 +49,16 @@ class Block:
         y = (self.ymin + self.ymax) / 2
         return x, y
     
+    def coords(self):
+        """
+        Integer position of the block on the grid of its own level.
+        Returns (level, i, j) with i along x and j along y; this identifies the
+        block uniquely and stays stable across refine/coarsen cycles.
+        """
+        width  = self.xmax - self.xmin
+        height = self.ymax - self.ymin
+        return self.level, int(round(self.xmin / width)), int(round(self.ymin / height))
+
     def get_root(self):
         """
         Get the root block of the tree.
@@ -50,25 +73,32 @@ class Block:
     # Simulation Logic
     # =========================================================
     
-    def perturb(self, perturbation):
+    def perturb(self, perturbation, purpose=PERTURB):
         """
         Perturb the block by a random value between -perturbation and perturbation.
+        purpose tells the draws apart for the counter-based RNG (see counter_rng).
         """
 
         if not self.active:
             for child in self.children:
-                child.perturb(perturbation)
+                child.perturb(perturbation, purpose)
             return
         else:
-            new_x1 = self.x1 + self.sim.rng.uniform(-perturbation, perturbation)
-            new_x2 = self.x2 + self.sim.rng.uniform(-perturbation, perturbation)
-            new_x3 = self.x3 + self.sim.rng.uniform(-perturbation, perturbation)
-            new_x4 = self.x4 + self.sim.rng.uniform(-perturbation, perturbation)
+            lows  = (-perturbation,) * 4
+            highs = (perturbation,) * 4
+            d1, d2, d3, d4 = self.sim.block_rng.uniform4(self, purpose, lows, highs)
+            new_x1 = self.x1 + d1
+            new_x2 = self.x2 + d2
+            new_x3 = self.x3 + d3
+            new_x4 = self.x4 + d4
 
             self.x1 = max(0.0, new_x1)
             self.x2 = max(0.0, new_x2)
             self.x3 = max(0.0, new_x3)
             self.x4 = max(0.0, new_x4)
+
+            if perturbation != 0:
+                self.dirty = True
         return
     
     def refine(self):
@@ -78,14 +108,26 @@ class Block:
 
         if not self.active:
             return
+        if self.sim.executor is not None:
+            self.sim.executor.fetch(self) # values live in the worker arrays
 
         cx, cy = self.center()
-        self.children = [
-            Block(self.sim, self.xmin, cx, self.ymin, cy), #b0
-            Block(self.sim, cx, self.xmax, self.ymin, cy), #b1
-            Block(self.sim, self.xmin, cx, cy, self.ymax), #b2
-            Block(self.sim, cx, self.xmax, cy, self.ymax)  #b3
-        ]
+        level = self.level + 1
+        pool = self.sim.block_pool
+        if pool is not None:
+            self.children = [
+                pool.acquire(self.xmin, cx, self.ymin, cy, level), #b0
+                pool.acquire(cx, self.xmax, self.ymin, cy, level), #b1
+                pool.acquire(self.xmin, cx, cy, self.ymax, level), #b2
+                pool.acquire(cx, self.xmax, cy, self.ymax, level)  #b3
+            ]
+        else:
+            self.children = [
+                Block(self.sim, self.xmin, cx, self.ymin, cy, level), #b0
+                Block(self.sim, cx, self.xmax, self.ymin, cy, level), #b1
+                Block(self.sim, self.xmin, cx, cy, self.ymax, level), #b2
+                Block(self.sim, cx, self.xmax, cy, self.ymax, level)  #b3
+            ]
 
         # Set the level of the children blocks
         for i in range(4):
@@ -94,10 +136,9 @@ class Block:
             self.children[i].parent = self
 
             # Set the values of the children blocks based on the parent block
-            self.children[i].x1 = self.sim.rng.uniform(self.x2, self.x3)
-            self.children[i].x2 = self.sim.rng.uniform(self.x1, self.x4)
-            self.children[i].x3 = self.sim.rng.uniform(self.x1, self.x4)
-            self.children[i].x4 = self.sim.rng.uniform(self.x2, self.x3)
+            child = self.children[i]
+            child.x1, child.x2, child.x3, child.x4 = self.sim.block_rng.uniform4(
+                child, REFINE, (self.x2, self.x1, self.x1, self.x2), (self.x3, self.x4, self.x4, self.x3))
 
         # Update the simulation's leaf cache
         self.sim.leaves.remove(self)
@@ -121,6 +162,9 @@ class Block:
             child.coarsen()
 
         # 4. Aggregate corner values from the (now-leaf) children.
+        if self.sim.executor is not None:
+            for child in self.children:
+                self.sim.executor.fetch(child)
         n = len(self.children) # typically 4, but stay generic
         self.x1 = sum(c.x1 for c in self.children) / n
         self.x2 = sum(c.x2 for c in self.children) / n
@@ -134,8 +178,11 @@ class Block:
         self.sim.leaves.remove(self.children[3])
         self.sim.leaves.append(self)
 
+        if self.sim.block_pool is not None:
+            self.sim.block_pool.release(self.children)
         self.children.clear()
         self.active = True
+        self.dirty = True
         return
     
     # =========================================================
@@ -146,3 +193,62 @@ class Block:
         arr = np.asarray([self.x1, self.x2, self.x3, self.x4], dtype=dtype)
         arr.tofile(open(filename, "ab"))
         return
+
+class BlockPool:
+    """
+    Free list of Blocks for refine/coarsen churn.
+
+    Coarsening releases the four children to the pool and refining takes its
+    children from it, so regions the shape passes over again reuse the same
+    objects instead of allocating new ones. Children come without initial random
+    draws: refine overwrites their values right away. (With rng="sequential"
+    this skips draws from the shared stream, so results differ from a run
+    without the pool; with rng="counter" they are identical.)
+
+    Counters:
+      requests   blocks handed out by acquire
+      allocated  of those, newly constructed Blocks
+      reused     of those, taken from the free list
+      released   blocks returned by coarsen
+      skipped    initial random draws (of four values) not made
+    """
+
+    def __init__(self, sim):
+        self.sim       = sim
+        self.free      = []
+        self.requests  = 0
+        self.allocated = 0
+        self.reused    = 0
+        self.released  = 0
+        self.skipped   = 0
+
+    def acquire(self, xmin, xmax, ymin, ymax, level):
+        self.requests += 1
+        self.skipped  += 1
+        if self.free:
+            block = self.free.pop()
+            block.reset(xmin, xmax, ymin, ymax, level, (0.0, 0.0, 0.0, 0.0))
+            self.reused += 1
+            return block
+        self.allocated += 1
+        return Block(self.sim, xmin, xmax, ymin, ymax, level, (0.0, 0.0, 0.0, 0.0))
+
+    def release(self, blocks):
+        """
+        Return leaf blocks that are no longer part of the mesh.
+        """
+        for block in blocks:
+            block.parent = None
+            self.free.append(block)
+        self.released += len(blocks)
+        return
+
+    def stats(self):
+        return {
+            "requests":  self.requests,
+            "allocated": self.allocated,
+            "reused":    self.reused,
+            "released":  self.released,
+            "skipped":   self.skipped,
+            "free":      len(self.free),
+        }
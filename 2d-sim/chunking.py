@@ -0,0 +1,325 @@
+'''
+Chunk boundary generation for simulation checkpoints.
+
+A chunking is described by its boundaries: a uint64 array holding the end offset
+(exclusive) of every chunk, so the last entry is always the length of the stream.
+Boundaries are written next to a checkpoint as `<checkpoint>.chunks` (raw little
+endian uint64) so that the dedup engine and the analysis scripts can pick them up
+without re-chunking.
+
+Content-defined chunking (CDC) uses a gear rolling hash over the byte stream.
+Inserting or removing a leaf only moves the boundaries near the edit; everything
+after it re-synchronizes, so shifted duplicates are found again.
+
+AMR-aware chunking uses the mesh metadata the simulation writes as
+`<checkpoint>.meta` instead of the bytes: chunks follow the quadtree, so unrefined
+regions collapse into a few large chunks and refined regions split into one chunk
+per group of siblings.
+'''
+
+import hashlib
+import os
+import sys
+import numpy as np
+
+GEAR_WINDOW = 64 # bytes that influence the gear hash at each position
+
+# Default CDC bounds (bytes). Every bound must be a multiple of the alignment.
+DEFAULT_MIN_SIZE = 128
+DEFAULT_AVG_SIZE = 512
+DEFAULT_MAX_SIZE = 2048
+DEFAULT_ALIGN    = 4   # never split a float32
+
+# One record per leaf, in dump order
+LEAF_META_DTYPE = np.dtype([
+    ("offset", "<u8"), # byte offset of the leaf in the checkpoint
+    ("nbytes", "<u4"), # bytes written for the leaf
+    ("level",  "<u2"), # refinement level
+    ("i",      "<u4"), # x index on the grid of its level
+    ("j",      "<u4"), # y index on the grid of its level
+    ("dirty",  "u1"),  # values changed since the previous dump
+    ("prev_offset", "<i8"), # offset in the previous dump, -1 if not dumped then
+])
+
+# =========================================================
+# Helpers
+# =========================================================
+
+def as_byte_array(data):
+    """
+    View bytes, a buffer, a numpy array or a file path as a flat uint8 array.
+    """
+    if isinstance(data, (str, os.PathLike)):
+        return np.fromfile(data, dtype=np.uint8)
+    if isinstance(data, np.ndarray):
+        return np.ascontiguousarray(data).view(np.uint8).reshape(-1)
+    return np.frombuffer(data, dtype=np.uint8)
+
+def gear_table(seed=0):
+    """
+    256 random 64-bit values, one per byte value.
+    The table must be identical for every checkpoint that is compared.
+    """
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 2**64, size=256, dtype=np.uint64, endpoint=False)
+
+def gear_hash(data, table=None):
+    """
+    Gear hash of the GEAR_WINDOW bytes ending at every position of `data`.
+
+    The sequential definition h[i] = (h[i-1] << 1) + G[b[i]] (mod 2^64) equals
+    sum_k G[b[i-k]] << k for k < 64, which doubles cleanly:
+        h_2w[i] = h_w[i] + (h_w[i-w] << w)
+    so the whole stream is hashed in log2(64) = 6 vectorized passes.
+    """
+    b = as_byte_array(data)
+    if table is None:
+        table = gear_table()
+
+    h = table[b]
+    w = 1
+    while w < GEAR_WINDOW:
+        shifted = np.zeros_like(h)
+        shifted[w:] = h[:-w] << np.uint64(w)
+        h = h + shifted
+        w *= 2
+    return h
+
+def _top_mask(bits):
+    """Mask selecting the `bits` most significant bits of a 64-bit hash."""
+    bits = max(1, min(63, bits))
+    return np.uint64(((1 << bits) - 1) << (64 - bits))
+
+# =========================================================
+# Boundary generation
+# =========================================================
+
+def fixed_boundaries(length, chunk_size):
+    """
+    Boundaries of fixed-size chunking (what the dedup engine does today).
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    ends = np.arange(chunk_size, length, chunk_size, dtype=np.uint64)
+    return np.append(ends, np.uint64(length)) if length > 0 else ends
+
+def cdc_boundaries(data, min_size=DEFAULT_MIN_SIZE, avg_size=DEFAULT_AVG_SIZE,
+                   max_size=DEFAULT_MAX_SIZE, align=DEFAULT_ALIGN, table=None):
+    """
+    Content-defined chunk boundaries using FastCDC-style normalized chunking.
+
+    • No chunk is shorter than min_size (except the last) or longer than max_size.
+    • Before avg_size a stricter mask is used, after it a looser one, which
+      pulls the chunk size distribution towards avg_size.
+    • Cut points are restricted to multiples of `align` so values are never split.
+    """
+    if not (0 < min_size <= avg_size <= max_size):
+        raise ValueError("chunk sizes must satisfy 0 < min_size <= avg_size <= max_size")
+    if align <= 0 or any(s % align for s in (min_size, avg_size, max_size)):
+        raise ValueError(f"chunk sizes must be multiples of align={align}")
+
+    b = as_byte_array(data)
+    n = len(b)
+    if n == 0:
+        return np.zeros(0, dtype=np.uint64)
+
+    h = gear_hash(b, table)
+    bits = int(round(np.log2(avg_size / align))) # only aligned positions are candidates
+    mask_strict = _top_mask(bits + 2)
+    mask_loose  = _top_mask(bits - 2)
+
+    # cut after byte i lands at offset i + 1
+    cuts = np.arange(1, n + 1, dtype=np.int64)
+    aligned = (cuts % align) == 0
+    strict = cuts[aligned & ((h & mask_strict) == 0)]
+    loose  = cuts[aligned & ((h & mask_loose) == 0)]
+
+    boundaries = []
+    start = 0
+    while start < n:
+        if start + min_size >= n:
+            cut = n
+        else:
+            cut = None
+            i = np.searchsorted(strict, start + min_size)
+            if i < len(strict) and strict[i] < start + avg_size:
+                cut = int(strict[i])
+            else:
+                j = np.searchsorted(loose, start + avg_size)
+                if j < len(loose) and loose[j] <= start + max_size:
+                    cut = int(loose[j])
+            if cut is None:
+                cut = min(start + max_size, n)
+        boundaries.append(cut)
+        start = cut
+
+    return np.asarray(boundaries, dtype=np.uint64)
+
+def amr_boundaries(meta, max_size=DEFAULT_MAX_SIZE):
+    """
+    Boundaries on quadtree subtree edges, computed from leaf metadata.
+
+    • Leaves sharing a parent (siblings) form one chunk.
+    • Consecutive unrefined roots (level 0) are merged into one chunk.
+    • A chunk is cut at a leaf edge once it would exceed max_size bytes
+      (None for no limit; a uniform mesh, all level 0, is then a single chunk).
+    Leaves must be in tree order for siblings to be contiguous.
+    """
+    n = len(meta)
+    if n == 0:
+        return np.zeros(0, dtype=np.uint64)
+
+    level = meta["level"].astype(np.int64)
+    pi = np.where(level > 0, meta["i"].astype(np.int64) >> 1, -1)
+    pj = np.where(level > 0, meta["j"].astype(np.int64) >> 1, -1)
+    ends = meta["offset"].astype(np.int64) + meta["nbytes"].astype(np.int64)
+
+    # new group wherever the (level, parent) key changes between neighbours
+    cut = np.zeros(n, dtype=bool)
+    cut[:-1] = (level[1:] != level[:-1]) | (pi[1:] != pi[:-1]) | (pj[1:] != pj[:-1])
+    cut[-1] = True
+
+    if max_size is not None:
+        if np.any(meta["nbytes"] > max_size):
+            raise ValueError("max_size is smaller than a single leaf")
+        # walk the leaves and cut before the one that would overflow the chunk
+        offsets = meta["offset"].astype(np.int64)
+        chunk_start = offsets[0]
+        for k in range(n):
+            if ends[k] - chunk_start > max_size:
+                cut[k - 1] = True
+                chunk_start = offsets[k]
+            if cut[k]:
+                chunk_start = ends[k]
+
+    return ends[cut].astype(np.uint64)
+
+def fixed_duplicate_chunks(meta, boundaries, prev_boundaries):
+    """
+    True for every chunk whose leaves are all clean and unmoved since the
+    previous dump and whose [start, end) was also a chunk of that dump
+    (prev_boundaries). Such chunks are fixed duplicates and need no hashing.
+    """
+    boundaries = np.asarray(boundaries, dtype=np.int64)
+    prev_edges = np.append(0, np.asarray(prev_boundaries, dtype=np.int64))
+    starts = np.append(0, boundaries[:-1])
+    # the start must be a previous edge and the end the edge right after it
+    k = np.searchsorted(prev_edges, starts)
+    k = np.minimum(k, len(prev_edges) - 1)
+    nxt = np.minimum(k + 1, len(prev_edges) - 1)
+    fixed = (prev_edges[k] == starts) & (k + 1 < len(prev_edges)) & (prev_edges[nxt] == boundaries)
+    if len(meta) == 0:
+        return fixed
+
+    offsets = meta["offset"].astype(np.int64)
+    unchanged = (meta["dirty"] == 0) & (meta["prev_offset"] == offsets)
+
+    # chunk index of every leaf; a leaf spanning two chunks marks both
+    first = np.searchsorted(boundaries, offsets, side="right")
+    last  = np.searchsorted(boundaries, offsets + meta["nbytes"].astype(np.int64) - 1, side="right")
+    np.logical_and.at(fixed, first, unchanged)
+    np.logical_and.at(fixed, last, unchanged)
+    return fixed
+
+# =========================================================
+# I/O
+# =========================================================
+
+def boundaries_path(checkpoint):
+    return str(checkpoint) + ".chunks"
+
+def write_boundaries(filename, boundaries):
+    np.asarray(boundaries, dtype="<u8").tofile(filename)
+    return
+
+def read_boundaries(filename):
+    return np.fromfile(filename, dtype="<u8")
+
+def metadata_path(checkpoint):
+    return str(checkpoint) + ".meta"
+
+def write_metadata(filename, meta):
+    with open(filename, "wb") as f:
+        np.save(f, np.asarray(meta, dtype=LEAF_META_DTYPE))
+    return
+
+def read_metadata(filename):
+    return np.load(filename)
+
+def chunk_sizes(boundaries):
+    b = np.asarray(boundaries, dtype=np.int64)
+    return np.diff(b, prepend=0)
+
+def chunk_digests(data, boundaries):
+    """
+    Digest of every chunk, in order. Used to count duplicates across checkpoints.
+    """
+    b = as_byte_array(data).tobytes()
+    digests = []
+    start = 0
+    for end in np.asarray(boundaries, dtype=np.int64):
+        digests.append(hashlib.blake2b(b[start:end], digest_size=16).digest())
+        start = end
+    return digests
+
+# =========================================================
+# Command line
+# =========================================================
+
+def main(argv):
+    """
+    Chunk a series of checkpoints, write their .chunks files and report how many
+    chunks of each checkpoint were already seen in an earlier one. In amr mode
+    it also reports the fixed duplicates (fixed_duplicate_chunks) and fails if
+    one of them is not a chunk of the previous checkpoint.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Content-defined chunking of checkpoint files.")
+    parser.add_argument("checkpoints", nargs="+", help="Checkpoint files, in timestep order.")
+    parser.add_argument("--mode", choices=["cdc", "amr", "fixed"], default="cdc")
+    parser.add_argument("--min-size", type=int, default=DEFAULT_MIN_SIZE)
+    parser.add_argument("--avg-size", type=int, default=DEFAULT_AVG_SIZE)
+    parser.add_argument("--max-size", type=int, default=DEFAULT_MAX_SIZE)
+    parser.add_argument("--align", type=int, default=DEFAULT_ALIGN)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_AVG_SIZE, help="Chunk size for --mode fixed.")
+    parser.add_argument("--amr-max-size", type=int, default=DEFAULT_MAX_SIZE, help="Largest chunk for --mode amr.")
+    parser.add_argument("--no-write", action="store_true", help="Do not write .chunks files.")
+    args = parser.parse_args(argv)
+
+    table = gear_table()
+    seen = set()
+    prev_bounds, prev_digests = None, set()
+    print(f"{'checkpoint':<40} {'bytes':>10} {'chunks':>8} {'new':>8} {'dup':>8} {'fixed':>8}")
+    for path in args.checkpoints:
+        data = as_byte_array(path)
+        fixed = None
+        if args.mode == "cdc":
+            bounds = cdc_boundaries(data, args.min_size, args.avg_size, args.max_size, args.align, table)
+        elif args.mode == "amr":
+            meta = read_metadata(metadata_path(path))
+            bounds = amr_boundaries(meta, args.amr_max_size)
+            if prev_bounds is not None:
+                fixed = fixed_duplicate_chunks(meta, bounds, prev_bounds)
+        else:
+            bounds = fixed_boundaries(len(data), args.chunk_size)
+        if not args.no_write:
+            write_boundaries(boundaries_path(path), bounds)
+
+        new = 0
+        digests = chunk_digests(data, bounds)
+        for d in digests:
+            if d not in seen:
+                seen.add(d)
+                new += 1
+        if fixed is not None:
+            missed = [k for k in np.flatnonzero(fixed).tolist() if digests[k] not in prev_digests]
+            if missed:
+                raise ValueError(f"{path}: chunks {missed[:8]} are marked fixed but were not chunks of the previous checkpoint")
+        print(f"{os.path.basename(path):<40} {len(data):>10} {len(bounds):>8} {new:>8} {len(bounds) - new:>8} "
+              f"{int(fixed.sum()) if fixed is not None else '-':>8}")
+        prev_bounds, prev_digests = bounds, set(digests)
+    return
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
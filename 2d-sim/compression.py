@@ -0,0 +1,204 @@
+'''
+Compression baselines for the checkpoint dumps.
+
+To tell whether deduplication beats plain compression, every dump can also be
+compressed with the standard library codecs (zlib, lzma, bz2), optionally after
+a pre-filter that groups similar bytes:
+  shuffle    byte shuffle: the k-th byte of every value together (HDF5/Blosc
+             shuffle), so the slowly varying sign/exponent bytes form runs
+  transpose  corner-major layout: all x1, then all x2, ... instead of the
+             four corners of one leaf next to each other
+Filters chain with "+", e.g. "transpose+shuffle".
+
+CompressionBaseline runs the codecs in a thread pool (the codecs release the
+GIL), so compression overlaps the next simulation steps. For every dump and
+codec it records the compressed size and the compress/decompress throughput
+(after checking the round trip) and writes them to compression.csv. With
+write=True the compressed dumps are kept under compressed/<codec>/, which
+scripts/storage_usage.py accounts like any other checkpoint directory.
+'''
+
+import os
+import bz2
+import csv
+import lzma
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# name -> (compress(data, level), decompress(data), default level)
+CODECS = {
+    "zlib": (lambda data, level: zlib.compress(data, level), zlib.decompress, 6),
+    "lzma": (lambda data, level: lzma.compress(data, preset=level), lzma.decompress, 6),
+    "bz2":  (lambda data, level: bz2.compress(data, level), bz2.decompress, 9),
+}
+
+FILTERS = ("shuffle", "transpose")
+
+STATS_FILE = "compression.csv"
+STATS_COLUMNS = ["timestep", "codec", "level", "filter", "raw_bytes", "compressed_bytes",
+                 "ratio", "compress_MBps", "decompress_MBps"]
+
+MB = 1024.0 * 1024.0
+
+# =========================================================
+# Pre-filters
+# =========================================================
+
+def shuffle(data, itemsize):
+    """
+    Byte k of every item, for k = 0 .. itemsize-1, one after the other.
+    """
+    b = np.frombuffer(data, dtype=np.uint8)
+    return b.reshape(-1, itemsize).T.tobytes()
+
+def unshuffle(data, itemsize):
+    b = np.frombuffer(data, dtype=np.uint8)
+    return b.reshape(itemsize, -1).T.tobytes()
+
+def transpose(data, itemsize, columns=4):
+    """
+    Rows of `columns` items (the corners of a leaf) to column-major order.
+    """
+    b = np.frombuffer(data, dtype=np.uint8).reshape(-1, columns, itemsize)
+    return b.transpose(1, 0, 2).tobytes()
+
+def untranspose(data, itemsize, columns=4):
+    b = np.frombuffer(data, dtype=np.uint8).reshape(columns, -1, itemsize)
+    return b.transpose(1, 0, 2).tobytes()
+
+def parse_filter(prefilter):
+    """
+    List of filter names from None, "shuffle", "transpose+shuffle", ...
+    """
+    if not prefilter or prefilter == "none":
+        return []
+    names = prefilter.split("+")
+    for name in names:
+        if name not in FILTERS:
+            raise ValueError(f"Unknown compression filter: {name} (known: {', '.join(FILTERS)})")
+    return names
+
+def apply_filters(data, names, itemsize):
+    for name in names:
+        data = shuffle(data, itemsize) if name == "shuffle" else transpose(data, itemsize)
+    return data
+
+def undo_filters(data, names, itemsize):
+    for name in reversed(names):
+        data = unshuffle(data, itemsize) if name == "shuffle" else untranspose(data, itemsize)
+    return data
+
+# =========================================================
+# Compression
+# =========================================================
+
+def compress_payload(payload, codec, level=None, prefilter=None):
+    """
+    Compress a dump payload ((leaves, 4) array). Returns (compressed bytes, stats
+    dict with the STATS_COLUMNS except timestep). Raises RuntimeError if the
+    round trip does not give back the payload.
+    """
+    compress, decompress, default_level = CODECS[codec]
+    level = default_level if level is None else level
+    names = parse_filter(prefilter)
+    raw = np.ascontiguousarray(payload).tobytes()
+
+    start = time.perf_counter()
+    packed = compress(apply_filters(raw, names, payload.itemsize), level)
+    t_compress = time.perf_counter() - start
+
+    start = time.perf_counter()
+    restored = undo_filters(decompress(packed), names, payload.itemsize)
+    t_decompress = time.perf_counter() - start
+    if restored != raw:
+        raise RuntimeError(f"{codec} round trip changed the payload")
+
+    stats = {
+        "codec":            codec,
+        "level":            level,
+        "filter":           "+".join(names) or "none",
+        "raw_bytes":        len(raw),
+        "compressed_bytes": len(packed),
+        "ratio":            len(raw) / len(packed) if packed else 0.0,
+        "compress_MBps":    len(raw) / MB / t_compress if t_compress > 0 else 0.0,
+        "decompress_MBps":  len(raw) / MB / t_decompress if t_decompress > 0 else 0.0,
+    }
+    return packed, stats
+
+class CompressionBaseline:
+    """
+    Compress every submitted dump with each codec in a thread pool.
+    """
+
+    def __init__(self, output_dir, codecs=("zlib",), level=None, prefilter=None, workers=None, write=False):
+        if isinstance(codecs, str):
+            codecs = (codecs,)
+        for codec in codecs:
+            if codec not in CODECS:
+                raise ValueError(f"Unknown compression codec: {codec} (known: {', '.join(CODECS)})")
+        parse_filter(prefilter) # validate early
+
+        self.output_dir = output_dir
+        self.codecs     = tuple(codecs)
+        self.level      = level
+        self.prefilter  = prefilter
+        self.write      = write
+        self.pool       = ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1))
+        self.futures    = []
+        self.rows       = []
+
+    def submit(self, timestep, payload, name):
+        """
+        Queue the dump `name` (file name of the uncompressed dump) of `timestep`.
+        """
+        if payload.base is not None:
+            payload = payload.copy() # views of live simulation state change before the worker runs
+        for codec in self.codecs:
+            self.futures.append(self.pool.submit(self.__task, timestep, payload, name, codec))
+        return
+
+    def __task(self, timestep, payload, name, codec):
+        packed, stats = compress_payload(payload, codec, self.level, self.prefilter)
+        if self.write:
+            directory = os.path.join(self.output_dir, "compressed", codec)
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, f"{name}.{codec}"), "wb") as f:
+                f.write(packed)
+        return {"timestep": timestep, **stats}
+
+    def close(self):
+        """
+        Wait for all jobs, write compression.csv and return its rows.
+        """
+        for f in self.futures:
+            self.rows.append(f.result())
+        self.futures = []
+        self.pool.shutdown()
+
+        self.rows.sort(key=lambda r: (r["timestep"], self.codecs.index(r["codec"])))
+        os.makedirs(self.output_dir, exist_ok=True)
+        filename = os.path.join(self.output_dir, STATS_FILE)
+        with open(filename, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=STATS_COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.rows)
+        return self.rows
+
+    def summary(self):
+        """
+        One line per codec: overall ratio and throughput.
+        """
+        lines = []
+        for codec in self.codecs:
+            rows = [r for r in self.rows if r["codec"] == codec]
+            raw = sum(r["raw_bytes"] for r in rows)
+            packed = sum(r["compressed_bytes"] for r in rows)
+            t_c = sum(r["raw_bytes"] / MB / r["compress_MBps"] for r in rows if r["compress_MBps"])
+            t_d = sum(r["raw_bytes"] / MB / r["decompress_MBps"] for r in rows if r["decompress_MBps"])
+            lines.append(f"{codec}: {raw / MB:.2f} MB -> {packed / MB:.2f} MB "
+                         f"(ratio {raw / packed if packed else 0.0:.2f}, "
+                         f"{raw / MB / t_c if t_c else 0.0:.1f} MB/s compress, "
+                         f"{raw / MB / t_d if t_d else 0.0:.1f} MB/s decompress)")
+        return "\n".join(lines)
@@ -0,0 +1,179 @@
+'''
+Counter-based random numbers for the simulation.
+
+With a sequential generator every draw depends on all draws before it, so the
+values a block gets depend on the order blocks are visited. A counter-based
+generator instead computes each draw from a key and a counter:
+
+    key     = seed
+    counter = (Morton key of the block, timestep, purpose, level, stream)
+
+using the Philox-4x32-10 bijection (Salmon et al., "Parallel random numbers: as
+easy as 1, 2, 3", SC'11). A block's draws are the same whichever order, subset
+or process they are computed in, which makes phases over the leaves safe to
+reorder, vectorize and run on several workers.
+
+Every Philox call yields four 32-bit words, i.e. two 53-bit uniforms; a block
+needs four uniforms per operation (one per corner), so streams 0 and 1 are used.
+The functions accept Python ints or numpy arrays; arrays are processed in one
+vectorized pass.
+'''
+
+import numpy as np
+
+# What the draws are for; part of the counter so purposes never share values
+INIT    = 0 # initial corner values
+PERTURB = 1 # random perturbation of every leaf
+REFINE  = 2 # values of children created by refinement
+SHAPE   = 3 # perturbation by the moving shape
+
+PHILOX_M0 = 0xD2511F53
+PHILOX_M1 = 0xCD9E8D57
+PHILOX_W0 = 0x9E3779B9
+PHILOX_W1 = 0xBB67AE85
+MASK32    = 0xFFFFFFFF
+ROUNDS    = 10
+
+# =========================================================
+# Philox-4x32
+# =========================================================
+
+def _philox_scalar(c0, c1, c2, c3, k0, k1, rounds=ROUNDS):
+    for r in range(rounds):
+        if r:
+            k0 = (k0 + PHILOX_W0) & MASK32
+            k1 = (k1 + PHILOX_W1) & MASK32
+        p0 = PHILOX_M0 * c0
+        p1 = PHILOX_M1 * c2
+        c0, c1, c2, c3 = ((p1 >> 32) ^ c1 ^ k0, p1 & MASK32,
+                          (p0 >> 32) ^ c3 ^ k1, p0 & MASK32)
+    return c0, c1, c2, c3
+
+def _philox_vector(c0, c1, c2, c3, k0, k1, rounds=ROUNDS):
+    c0, c1, c2, c3 = (np.asarray(c, dtype=np.uint64) & np.uint64(MASK32) for c in (c0, c1, c2, c3))
+    k0 = np.uint64(k0)
+    k1 = np.uint64(k1)
+    m0, m1, mask, shift = np.uint64(PHILOX_M0), np.uint64(PHILOX_M1), np.uint64(MASK32), np.uint64(32)
+    for r in range(rounds):
+        if r:
+            k0 = (k0 + np.uint64(PHILOX_W0)) & mask
+            k1 = (k1 + np.uint64(PHILOX_W1)) & mask
+        p0 = m0 * c0 # < 2**64, no overflow
+        p1 = m1 * c2
+        c0, c1, c2, c3 = ((p1 >> shift) ^ c1 ^ k0, p1 & mask,
+                          (p0 >> shift) ^ c3 ^ k1, p0 & mask)
+    return c0, c1, c2, c3
+
+def philox4x32(c0, c1, c2, c3, k0, k1, rounds=ROUNDS):
+    """
+    Philox-4x32 of the counter (c0, c1, c2, c3) under the key (k0, k1).
+    Python ints in, Python ints out; numpy arrays in, uint64 arrays out.
+    """
+    if all(isinstance(c, (int, np.integer)) for c in (c0, c1, c2, c3)):
+        return _philox_scalar(int(c0) & MASK32, int(c1) & MASK32, int(c2) & MASK32, int(c3) & MASK32,
+                              int(k0) & MASK32, int(k1) & MASK32, rounds)
+    return _philox_vector(c0, c1, c2, c3, int(k0) & MASK32, int(k1) & MASK32, rounds)
+
+# =========================================================
+# Block keys
+# =========================================================
+
+def _spread_bits(v):
+    """
+    Insert a zero bit between each of the low 32 bits of v (works on ints and uint64 arrays).
+    """
+    scalar = isinstance(v, (int, np.integer))
+    v = int(v) if scalar else np.asarray(v, dtype=np.uint64)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF),
+                        (4, 0x0F0F0F0F0F0F0F0F), (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        if scalar:
+            v = (v | (v << shift)) & mask
+        else:
+            v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+def morton_key(i, j):
+    """
+    Z-order (Morton) index of grid position (i, j): bits of i at even, j at odd positions.
+    """
+    return _spread_bits(i) | (_spread_bits(j) << (1 if isinstance(j, (int, np.integer)) else np.uint64(1)))
+
+class CounterRNG:
+    """
+    Uniform draws keyed by (seed, block, timestep, purpose).
+    """
+
+    def __init__(self, seed):
+        self.seed = seed
+        self.k0   = seed & MASK32
+        self.k1   = (seed >> 32) & MASK32
+
+    def words(self, level, i, j, timestep, purpose, stream=0):
+        """
+        Four 32-bit random words for one counter (or an array of counters).
+        """
+        z = morton_key(i, j)
+        if isinstance(z, int):
+            c3 = ((purpose & 0xFF) << 24) | ((level & 0xFF) << 16) | (stream & 0xFFFF)
+            return philox4x32(z & MASK32, z >> 32, timestep, c3, self.k0, self.k1)
+
+        level = np.asarray(level, dtype=np.uint64)
+        c3 = (np.uint64((purpose & 0xFF) << 24) | ((level & np.uint64(0xFF)) << np.uint64(16))
+              | np.uint64(stream & 0xFFFF))
+        c2 = np.broadcast_to(np.asarray(timestep, dtype=np.uint64), z.shape)
+        return philox4x32(z & np.uint64(MASK32), z >> np.uint64(32), c2, c3, self.k0, self.k1)
+
+    def uniforms(self, level, i, j, timestep, purpose, n=4):
+        """
+        n uniforms in [0, 1) for each block; a tuple for scalar input,
+        an array of shape (len(i), n) for array input.
+        """
+        scalar = isinstance(i, (int, np.integer))
+        out = []
+        for stream in range((n + 1) // 2):
+            w = self.words(level, i, j, timestep, purpose, stream)
+            for a, b in ((w[0], w[1]), (w[2], w[3])):
+                if scalar:
+                    out.append(((a >> 5) * 67108864 + (b >> 6)) / 9007199254740992.0)
+                else:
+                    out.append(((a >> np.uint64(5)) * np.uint64(67108864) + (b >> np.uint64(6)))
+                               * (1.0 / 9007199254740992.0))
+        out = out[:n]
+        return tuple(out) if scalar else np.stack(out, axis=-1)
+
+    def uniform4(self, block, purpose, lows, highs):
+        """
+        Four draws for `block`, the k-th uniform in [lows[k], highs[k]).
+        """
+        level, i, j = block.coords()
+        u = self.uniforms(level, i, j, block.sim.timestep, purpose, 4)
+        return tuple(lo + (hi - lo) * x for lo, hi, x in zip(lows, highs, u))
+
+    def uniform4_batch(self, level, i, j, timestep, purpose, low, high):
+        """
+        uniform4 for many blocks at once, shape (len(i), 4); low and high
+        broadcast against it.
+        """
+        u = self.uniforms(np.asarray(level), np.asarray(i), np.asarray(j), timestep, purpose, 4)
+        return low + (high - low) * u
+
+class SequentialRNG:
+    """
+    The original scheme: every draw comes from one random.Random, in visiting order.
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def uniform4(self, block, purpose, lows, highs):
+        uniform = self.rng.uniform
+        return tuple(uniform(lo, hi) for lo, hi in zip(lows, highs))
+
+    def uniform4_batch(self, level, i, j, timestep, purpose, low, high):
+        """
+        The draws of uniform4 for the blocks in the given order; the positions
+        only give the count. Same values as calling uniform4 block by block.
+        """
+        random = self.rng.random
+        u = np.array([random() for _ in range(4 * len(i))], dtype=np.float64).reshape(-1, 4)
+        return low + (high - low) * u
@@ -0,0 +1,290 @@
+'''
+XOR delta checkpoints.
+
+Block.perturb adds small noise, so a block's values at consecutive steps share
+their sign, exponent and leading mantissa bits, but rarely a whole byte-exact
+chunk. A delta checkpoint stores, for every leaf, the XOR of its values' bit
+patterns with the same block's values in the previous step; the high-order
+bytes of the result are mostly zero. Blocks are matched by their stable
+identity (level, i, j), so refinement and coarsening between steps only make
+the new blocks fall back to their raw values.
+
+Like FPC (Burtscher & Ratanaworabhan, "FPC: A High-Speed Compressor for
+Double-Precision Floating-Point Data") and Gorilla, every XORed word is stored
+as a 4-bit count of its significant (non-zero high-order trimmed) bytes plus
+those bytes; the count and byte streams can additionally go through zlib.
+Every keyframe_every steps a keyframe stores the values against zero, so a
+reader only needs the steps since the last keyframe.
+
+File step_XXXX.delta:
+    header   HEADER (magic, version, itemsize, flags, word count, section sizes)
+    keys     zlib-compressed uint64 block keys, only when the leaves changed
+    counts   significant-byte counts, two per byte
+    bytes    the significant bytes of every word, low byte first
+'''
+
+import os
+import re
+import sys
+import time
+import zlib
+import struct
+import numpy as np
+
+MAGIC   = b"XDLT"
+VERSION = 1
+HEADER  = struct.Struct("<4sBBBBQQQQ") # magic, version, itemsize, flags, 0, words, keys, counts, bytes
+
+FLAG_KEYFRAME = 1
+FLAG_KEYS     = 2
+FLAG_ZLIB     = 4
+
+DELTA_PATTERN = re.compile(r"step_(\d+)\.delta$")
+STATS_FILE    = "delta.csv"
+
+MB = 1024.0 * 1024.0
+
+# =========================================================
+# Encoding
+# =========================================================
+
+def block_keys(level, i, j):
+    """
+    Stable identity of blocks as uint64: level in the top 8 bits, then i and j (28 bits each).
+    """
+    level, i, j = (np.asarray(a, dtype=np.uint64) for a in (level, i, j))
+    return (level << np.uint64(56)) | (i << np.uint64(28)) | j
+
+def match_previous(keys, prev_keys, prev_values):
+    """
+    Previous values of the blocks `keys` (rows of zeros for blocks that are new).
+    """
+    out = np.zeros((len(keys),) + prev_values.shape[1:], dtype=prev_values.dtype)
+    if len(prev_keys) == 0 or len(keys) == 0:
+        return out
+    order = np.argsort(prev_keys, kind="stable")
+    sorted_keys = prev_keys[order]
+    idx = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    found = sorted_keys[idx] == keys
+    out[found] = prev_values[order[idx[found]]]
+    return out
+
+def _word_dtype(itemsize):
+    return np.dtype(f"<u{itemsize}")
+
+def encode_words(words):
+    """
+    Significant-byte counts (packed two per byte) and significant bytes of
+    unsigned little-endian words.
+    """
+    itemsize = words.dtype.itemsize
+    counts = np.zeros(len(words), dtype=np.uint8)
+    for k in range(itemsize):
+        counts += (words >> words.dtype.type(8 * k)) != 0 # a byte at or above k is set
+    raw = words.view(np.uint8).reshape(-1, itemsize)
+    keep = np.arange(itemsize, dtype=np.uint8)[None, :] < counts[:, None]
+
+    padded = np.append(counts, np.uint8(0)) if len(counts) % 2 else counts
+    packed = padded[0::2] | (padded[1::2] << 4)
+    return packed.tobytes(), raw[keep].tobytes()
+
+def decode_words(packed, data, n, itemsize):
+    """
+    Inverse of encode_words: n words of `itemsize` bytes.
+    """
+    packed = np.frombuffer(packed, dtype=np.uint8)
+    counts = np.empty(2 * len(packed), dtype=np.uint8)
+    counts[0::2] = packed & 0x0F
+    counts[1::2] = packed >> 4
+    counts = counts[:n]
+    keep = np.arange(itemsize, dtype=np.uint8)[None, :] < counts[:, None]
+    raw = np.zeros((n, itemsize), dtype=np.uint8)
+    raw[keep] = np.frombuffer(data, dtype=np.uint8)
+    return raw.reshape(-1).view(_word_dtype(itemsize))
+
+# =========================================================
+# Writer
+# =========================================================
+
+class DeltaWriter:
+    """
+    Write one step_XXXX.delta per dump into `directory`.
+
+    keyframe_every: a full (non-delta) frame every this many frames, the first
+                    frame always being one
+    compress:       also run the count and byte streams through zlib (level 1)
+    """
+
+    def __init__(self, directory, keyframe_every=10, compress=False):
+        self.directory      = directory
+        self.keyframe_every = max(1, keyframe_every)
+        self.compress       = compress
+        self.frames         = 0
+        self.prev_keys      = None
+        self.prev_values    = None
+        self.rows           = [] # (timestep, keyframe, raw bytes, encoded bytes, seconds)
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, timestep, keys, payload):
+        """
+        Encode `payload` ((blocks, 4) float array) of the blocks `keys` (block_keys).
+        Returns the number of bytes written.
+        """
+        start = time.perf_counter()
+        keys = np.asarray(keys, dtype=np.uint64)
+        payload = np.ascontiguousarray(payload)
+        itemsize = payload.dtype.itemsize
+        words = payload.reshape(-1).view(_word_dtype(itemsize))
+
+        keyframe = self.frames % self.keyframe_every == 0 or self.prev_values is None \
+            or self.prev_values.dtype != payload.dtype
+        flags = FLAG_KEYFRAME if keyframe else 0
+        if not keyframe:
+            prev = match_previous(keys, self.prev_keys, self.prev_values)
+            words = words ^ prev.reshape(-1).view(_word_dtype(itemsize))
+
+        keys_blob = b""
+        if keyframe or not np.array_equal(keys, self.prev_keys):
+            flags |= FLAG_KEYS
+            keys_blob = zlib.compress(keys.tobytes(), 6)
+
+        counts, data = encode_words(words)
+        if self.compress:
+            flags |= FLAG_ZLIB
+            counts, data = zlib.compress(counts, 1), zlib.compress(data, 1)
+
+        filename = os.path.join(self.directory, f"step_{timestep:04d}.delta")
+        with open(filename, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, itemsize, flags, 0, len(words),
+                                len(keys_blob), len(counts), len(data)))
+            f.write(keys_blob)
+            f.write(counts)
+            f.write(data)
+
+        self.prev_keys   = keys.copy()
+        self.prev_values = payload.copy()
+        self.frames += 1
+        nbytes = HEADER.size + len(keys_blob) + len(counts) + len(data)
+        self.rows.append((timestep, int(keyframe), payload.nbytes, nbytes, time.perf_counter() - start))
+        return nbytes
+
+    def close(self):
+        """
+        Write delta.csv (per frame sizes and encode time) next to the frames.
+        """
+        with open(os.path.join(self.directory, STATS_FILE), "w") as f:
+            f.write("timestep,keyframe,raw_bytes,encoded_bytes,ratio,encode_MBps\n")
+            for ts, key, raw, enc, secs in self.rows:
+                f.write(f"{ts},{key},{raw},{enc},{raw / enc if enc else 0.0},"
+                        f"{raw / MB / secs if secs > 0 else 0.0}\n")
+        return
+
+    def summary(self):
+        raw = sum(r[2] for r in self.rows)
+        enc = sum(r[3] for r in self.rows)
+        secs = sum(r[4] for r in self.rows)
+        return (f"Delta: {raw / MB:.2f} MB -> {enc / MB:.2f} MB (ratio {raw / enc if enc else 0.0:.2f}, "
+                f"{raw / MB / secs if secs > 0 else 0.0:.1f} MB/s encode, "
+                f"{sum(r[1] for r in self.rows)} keyframes)")
+
+# =========================================================
+# Reader
+# =========================================================
+
+def read_frame(filename):
+    """
+    Header fields and raw sections of one .delta file.
+    """
+    with open(filename, "rb") as f:
+        head = f.read(HEADER.size)
+        magic, version, itemsize, flags, _, n, nkeys, ncounts, ndata = HEADER.unpack(head)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{filename} is not a version {VERSION} delta frame.")
+        keys, counts, data = f.read(nkeys), f.read(ncounts), f.read(ndata)
+    return itemsize, flags, n, keys, counts, data
+
+class DeltaReader:
+    """
+    Decode the frames of a DeltaWriter directory.
+
+    Frames depend on their predecessors back to the last keyframe; reading steps
+    in increasing order decodes every frame once.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.steps = sorted(int(m.group(1)) for m in map(DELTA_PATTERN.match, os.listdir(directory)) if m)
+        self.state = None # (timestep, keys, values) of the last decoded frame
+
+    def path(self, timestep):
+        return os.path.join(self.directory, f"step_{timestep:04d}.delta")
+
+    def __decode(self, timestep, prev):
+        itemsize, flags, n, keys, counts, data = read_frame(self.path(timestep))
+        if flags & FLAG_ZLIB:
+            counts, data = zlib.decompress(counts), zlib.decompress(data)
+        words = decode_words(counts, data, n, itemsize)
+        if flags & FLAG_KEYS:
+            keys = np.frombuffer(zlib.decompress(keys), dtype=np.uint64)
+        elif prev is None:
+            raise ValueError(f"Frame {timestep} reuses the keys of a frame that was not read.")
+        else:
+            keys = prev[1]
+
+        dtype = np.dtype(f"<f{itemsize}")
+        if not flags & FLAG_KEYFRAME:
+            if prev is None:
+                raise ValueError(f"Frame {timestep} is a delta without its previous frame.")
+            words = words ^ match_previous(keys, prev[1], prev[2]).reshape(-1).view(_word_dtype(itemsize))
+        return keys, words.view(dtype).reshape(-1, 4), bool(flags & FLAG_KEYFRAME)
+
+    def read(self, timestep):
+        """
+        (keys, values) of `timestep`, values of shape (blocks, 4).
+        """
+        if timestep not in self.steps:
+            raise ValueError(f"No delta frame for timestep {timestep} in {self.directory}.")
+        pos = self.steps.index(timestep)
+
+        # start from the cached frame if it precedes this one, else from the last keyframe
+        if self.state is not None and self.state[0] in self.steps[:pos + 1]:
+            start = self.steps.index(self.state[0]) + 1
+            prev = self.state
+            if start > pos:
+                return prev[1], prev[2]
+        else:
+            start = pos
+            while start > 0 and not read_frame(self.path(self.steps[start]))[1] & FLAG_KEYFRAME:
+                start -= 1
+            prev = None
+
+        for ts in self.steps[start:pos + 1]:
+            keys, values, _ = self.__decode(ts, prev)
+            prev = (ts, keys, values)
+        self.state = prev
+        return prev[1], prev[2]
+
+if __name__ == "__main__":
+    # Decode every frame (throughput) and optionally compare with the plain dumps
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python delta.py <delta_dir> [<dump_dir with step_XXXX.dat>]")
+        sys.exit(1)
+
+    reader = DeltaReader(sys.argv[1])
+    nbytes, seconds, mismatches = 0, 0.0, 0
+    for ts in reader.steps:
+        start = time.perf_counter()
+        _, values = reader.read(ts)
+        seconds += time.perf_counter() - start
+        nbytes += values.nbytes
+        if len(sys.argv) == 3:
+            dump = os.path.join(sys.argv[2], f"step_{ts:04d}.dat")
+            if values.tobytes() != open(dump, "rb").read():
+                print(f"Step {ts}: decoded values differ from {dump}")
+                mismatches += 1
+
+    print(f"Decoded {len(reader.steps)} frames, {nbytes / MB:.2f} MB "
+          f"at {nbytes / MB / seconds if seconds > 0 else 0.0:.1f} MB/s")
+    if len(sys.argv) == 3:
+        print("All frames match the dumps" if not mismatches else f"{mismatches} frames differ")
+        sys.exit(1 if mismatches else 0)
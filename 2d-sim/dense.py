@@ -0,0 +1,132 @@
+'''
+Dense array backend for uniform refinement.
+
+With uniform_refinement=True the mesh is a fixed Nu x Nu grid of level-0 blocks
+(Nu = size * 2**max_refinement) that never refines or coarsens, so it does not
+need one Block object per cell. DenseGrid keeps the corner values of all cells
+in a single (Nu, Nu, 4) array, row r / column c holding the block
+[c/Nu, (c+1)/Nu] x [r/Nu, (r+1)/Nu], and runs the per-step phases as array
+operations:
+  init / perturb    one batched draw for all (or the selected) cells
+  shape             border_crosses_batch over the cell bounds, masked update
+  dump              the value array itself, written with a single tofile
+
+Cells are visited in row-major order, the order of Simulation.leaves in the
+Block backend, so both backends consume the same draws: values agree up to the
+storage dtype (the dump dtype here, float64 in the Blocks).
+'''
+
+import numpy as np
+import chunking
+from counter_rng import INIT, morton_key
+
+class DenseGrid:
+    """
+    Corner values, dirty flags and previous dump offsets of a uniform grid.
+    """
+
+    def __init__(self, n, block_rng, dtype=np.float32):
+        self.n         = n
+        self.block_rng = block_rng
+        self.dtype     = np.dtype(dtype)
+
+        # cell positions and bounds, flattened row-major (Block.coords / xmin..ymax)
+        rows, cols = np.divmod(np.arange(n * n, dtype=np.int64), n)
+        step_size  = 1.0 / n
+        self.i     = cols
+        self.j     = rows
+        self.level = np.zeros(n * n, dtype=np.int64)
+        self.xmin  = cols * step_size
+        self.xmax  = (cols + 1) * step_size
+        self.ymin  = rows * step_size
+        self.ymax  = (rows + 1) * step_size
+
+        self.values      = np.empty((n, n, 4), dtype=self.dtype)
+        self.dirty       = np.ones((n, n), dtype=bool)
+        self.dump_offset = np.full((n, n), -1, dtype=np.int64)
+        self.flat_values = self.values.reshape(-1, 4) # views, same memory
+        self.flat_dirty  = self.dirty.reshape(-1)
+        self.flat_offset = self.dump_offset.reshape(-1)
+
+        self.flat_values[:] = self.__draw(slice(None), 0, INIT, 0.0, 1.0)
+
+    def __len__(self):
+        return self.n * self.n
+
+    def __draw(self, cells, timestep, purpose, low, high):
+        return self.block_rng.uniform4_batch(self.level[cells], self.i[cells], self.j[cells],
+                                             timestep, purpose, low, high)
+
+    # =========================================================
+    # Simulation Logic
+    # =========================================================
+
+    def perturb(self, perturbation, purpose, timestep, cells=slice(None)):
+        """
+        Block.perturb for the given cells (flat indices, default all) in one pass.
+        """
+        d = self.__draw(cells, timestep, purpose, -perturbation, perturbation)
+        if len(d) == 0:
+            return 0
+        self.flat_values[cells] = np.maximum(0.0, self.flat_values[cells] + d)
+        if perturbation != 0:
+            self.flat_dirty[cells] = True
+        return len(d)
+
+    def border_cells(self, shape, timestep):
+        """
+        Flat indices of the cells whose border `shape` crosses, in row-major order.
+        """
+        return np.flatnonzero(shape.border_crosses_batch(timestep, self.xmin, self.xmax, self.ymin, self.ymax))
+
+    def means(self):
+        """
+        Mean corner value of every cell, shape (n, n).
+        """
+        return self.values.mean(axis=2, dtype=np.float64)
+
+    # =========================================================
+    # I/O
+    # =========================================================
+
+    def dump_order(self, sfc=False):
+        """
+        Flat cell indices in dump order: None for storage (row-major) order,
+        Morton order of the cells when sfc is set (what ranks mode writes).
+        """
+        if not sfc:
+            return None
+        return np.argsort(morton_key(self.i, self.j), kind="stable")
+
+    def leaf_values(self, order=None, dtype=np.float32):
+        """
+        Corner values in dump order, shape (len(self), 4). Storage order with a
+        matching dtype is a view of the grid, so dumping it copies nothing.
+        """
+        values = self.flat_values if order is None else self.flat_values[order]
+        return values.astype(dtype, copy=False)
+
+    def leaf_metadata(self, order=None, itemsize=4):
+        """
+        Simulation.leaf_metadata for the cells in dump order.
+        """
+        cells = slice(None) if order is None else order
+        nbytes = 4 * itemsize
+        meta = np.zeros(len(self), dtype=chunking.LEAF_META_DTYPE)
+        meta["offset"] = np.arange(len(self), dtype=np.uint64) * nbytes
+        meta["nbytes"] = nbytes
+        meta["level"] = self.level[cells]
+        meta["i"] = self.i[cells]
+        meta["j"] = self.j[cells]
+        meta["dirty"] = self.flat_dirty[cells]
+        meta["prev_offset"] = self.flat_offset[cells]
+        return meta
+
+    def reset_dirty(self, order, nbytes):
+        """
+        Mark every cell clean and remember where it was written.
+        """
+        cells = slice(None) if order is None else order
+        self.flat_dirty[:] = False
+        self.flat_offset[cells] = np.arange(len(self), dtype=np.int64) * nbytes
+        return
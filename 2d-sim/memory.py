@@ -0,0 +1,130 @@
+'''
+Memory usage sampling in the Kokkos memspace_usage format.
+
+The Kokkos MemoryUsage tool writes one <host>-<pid>-<Space>.memspace_usage file
+per memory space:
+
+    # Space Host
+    # Time(s)  Size(MB)   HighWater(MB)   HighWater-Process(MB)
+    0.000123 1.2 1.5 35.0
+
+MemorySampler writes the same layout for the Python simulation so the HPDC
+memory plots (analysis/plotting/hpdc_memory_*.py) read it unchanged:
+  Size(MB)               memory currently allocated by Python (tracemalloc)
+  HighWater(MB)          peak of the above since sampling started
+  HighWater-Process(MB)  peak resident set size of the whole process
+Without tracemalloc (trace=False) the first two columns fall back to the
+current resident set size and its running maximum.
+'''
+
+import os
+import socket
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+MB = 1024.0 * 1024.0
+
+def current_rss():
+    """
+    Resident set size of this process in bytes (0 if it cannot be read).
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def peak_rss():
+    """
+    Peak resident set size of this process in bytes.
+    """
+    if resource is None:
+        return current_rss()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+def usage_filename(directory, space="Host"):
+    return os.path.join(directory, f"{socket.gethostname()}-{os.getpid()}-{space}.memspace_usage")
+
+class MemorySampler:
+    """
+    Append one memspace_usage row per sample.
+
+    Call sample() at points of interest (e.g. step boundaries), or pass an
+    interval (seconds) to sample from a background thread as well.
+    """
+
+    def __init__(self, filename, interval=None, trace=True):
+        self.filename  = filename
+        self.interval  = interval
+        self.trace     = trace
+        self.highwater = 0
+        self.samples   = 0
+        self.lock      = threading.Lock()
+        self.stopped   = threading.Event()
+        self.thread    = None
+        self.own_trace = False
+
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.own_trace = True
+
+        self.start = time.perf_counter()
+        self.f = open(filename, "w", buffering=1) # line buffered: rows survive a crash
+        self.f.write("# Space Host\n")
+        self.f.write("# Time(s)  Size(MB)   HighWater(MB)   HighWater-Process(MB)\n")
+        self.sample()
+
+        if self.interval:
+            self.thread = threading.Thread(target=self.__poll, name="memory-sampler", daemon=True)
+            self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __poll(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """
+        Record the current usage. Returns (size, highwater, process highwater) in MB.
+        """
+        with self.lock:
+            if self.f.closed:
+                return None
+            if self.trace:
+                size, peak = tracemalloc.get_traced_memory()
+            else:
+                size = current_rss()
+                peak = size
+            self.highwater = max(self.highwater, peak, size)
+            row = (size / MB, self.highwater / MB, peak_rss() / MB)
+            self.f.write(f"{time.perf_counter() - self.start:.6f} {row[0]:.1f} {row[1]:.1f} {row[2]:.1f}\n")
+            self.samples += 1
+            return row
+
+    def close(self):
+        if self.thread is not None:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+        if not self.f.closed:
+            self.sample()
+            with self.lock:
+                self.f.close()
+        if self.own_trace:
+            tracemalloc.stop()
+            self.own_trace = False
+        return
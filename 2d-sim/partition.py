@@ -0,0 +1,331 @@
+'''
+Space-filling-curve partitioning and shared-memory parallel phases.
+
+The root grid (Simulation.mesh) is ordered along a Morton (Z) curve and cut into
+contiguous ranges of roots, one per worker, balanced by the number of leaves
+under each root. Because the quadtree below a root is also traversed in Z order,
+every worker owns one contiguous slice of the leaves.
+
+The topology (refine/coarsen, 2:1 balance enforcement) stays in the main
+process, which owns the Block objects. The per-leaf phases (random perturbation
+and perturbation by the shape) only touch leaf values; those live in
+multiprocessing.shared_memory arrays, one row per leaf in SFC order, and every
+worker updates its own slice in place. This requires the counter-based RNG,
+whose draws do not depend on who computes them.
+
+The rows stay authoritative between phases and steps, so the blocks' own values
+are behind them:
+  • a block the topology refines or coarsens fetches its row first (Block
+    calls PartitionedExecutor.fetch) and is no longer resident;
+  • before the next phase the arrays are re-laid out for the new leaves: rows of
+    resident leaves are moved with one gather, only new leaves are read from
+    their blocks (nothing is read when the topology did not change);
+  • sync() writes the rows back into the blocks once per step, before the dump
+    and the plot read them.
+That sync, the SFC traversal and the topology remain serial in the main process,
+so the speedup over workers=None is bounded by the share of the perturbation
+phases in a step.
+'''
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from counter_rng import CounterRNG, morton_key
+
+# =========================================================
+# Space-filling-curve ranges
+# =========================================================
+
+def sfc_roots(mesh):
+    """
+    Roots of a square/rectangular mesh (list of rows) in Morton order.
+    """
+    roots = [(morton_key(c, r), root) for r, row in enumerate(mesh) for c, root in enumerate(row)]
+    roots.sort(key=lambda kv: kv[0])
+    return [root for _, root in roots]
+
+def leaves_by_root(roots):
+    """
+    Leaves of every root in Z order, and the number of leaves under each root.
+    """
+    leaves = []
+    counts = np.zeros(len(roots), dtype=np.int64)
+    stack = []
+    for k, root in enumerate(roots):
+        start = len(leaves)
+        stack.append(root)
+        while stack:
+            block = stack.pop()
+            if block.active:
+                leaves.append(block)
+            else:
+                stack.extend(reversed(block.children))
+        counts[k] = len(leaves) - start
+    return leaves, counts
+
+def split_roots(weights, nparts):
+    """
+    Cut points (root indices, length nparts + 1) splitting `weights` into
+    contiguous ranges of roughly equal total weight.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    prefix = np.concatenate(([0.0], np.cumsum(weights)))
+    targets = prefix[-1] * np.arange(1, nparts) / nparts
+    inner = np.searchsorted(prefix, targets, side="left")
+    return np.concatenate(([0], np.clip(inner, 0, len(weights)), [len(weights)])).astype(np.int64)
+
+def leaf_ranges(counts, cuts):
+    """
+    [start, end) leaf index range of every part, given per-root leaf counts.
+    """
+    prefix = np.concatenate(([0], np.cumsum(counts)))
+    return [(int(prefix[a]), int(prefix[b])) for a, b in zip(cuts[:-1], cuts[1:])]
+
+# =========================================================
+# Shared leaf arrays
+# =========================================================
+
+# name -> (dtype, columns); one row per leaf
+LEAF_FIELDS = {
+    "values": (np.float64, 4), # x1, x2, x3, x4
+    "coords": (np.int64,   3), # level, i, j
+    "bounds": (np.float64, 4), # xmin, xmax, ymin, ymax
+    "dirty":  (np.uint8,   1),
+}
+
+class SharedLeaves:
+    """
+    Leaf arrays in shared memory, reallocated (doubling) when the leaves outgrow them.
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = 0
+        self.count    = 0
+        self.shms     = {}
+        self.arrays   = {}
+        self.__allocate(capacity)
+
+    def __allocate(self, capacity):
+        self.close()
+        self.capacity = capacity
+        for name, (dtype, cols) in LEAF_FIELDS.items():
+            nbytes = capacity * cols * np.dtype(dtype).itemsize
+            shm = shared_memory.SharedMemory(create=True, size=max(1, nbytes))
+            self.shms[name] = shm
+            self.arrays[name] = np.ndarray((capacity, cols), dtype=dtype, buffer=shm.buf)
+        return
+
+    def names(self):
+        return {name: shm.name for name, shm in self.shms.items()}
+
+    def load(self, leaves):
+        """
+        Copy the state of `leaves` into the shared arrays.
+        """
+        self.place(leaves, np.full(len(leaves), -1, dtype=np.int64))
+        return
+
+    def place(self, leaves, rows):
+        """
+        Lay the arrays out for `leaves`: row k takes the current row rows[k], or
+        the state of leaves[k] where rows[k] is -1.
+        """
+        kept = rows >= 0
+        moved = {name: a[rows[kept]] for name, a in self.arrays.items()} # copies
+        n = len(leaves)
+        if n > self.capacity:
+            self.__allocate(max(n, 2 * self.capacity))
+        self.count = n
+        for name, a in self.arrays.items():
+            a[:n][kept] = moved[name]
+
+        new = np.flatnonzero(~kept)
+        if len(new) == 0:
+            return
+        blocks = [leaves[k] for k in new.tolist()]
+        a = self.arrays
+        a["values"][new] = [(b.x1, b.x2, b.x3, b.x4) for b in blocks]
+        a["coords"][new] = [b.coords() for b in blocks]
+        a["bounds"][new] = [(b.xmin, b.xmax, b.ymin, b.ymax) for b in blocks]
+        a["dirty"][new, 0] = 0
+        return
+
+    def store(self, leaves, rows):
+        """
+        Copy values (and newly set dirty flags) of `rows` back into `leaves`
+        (one block per row) and clear those flags.
+        """
+        values = self.arrays["values"][rows].tolist()
+        dirty = self.arrays["dirty"][rows, 0]
+        for block, (x1, x2, x3, x4) in zip(leaves, values):
+            block.x1, block.x2, block.x3, block.x4 = x1, x2, x3, x4
+        for idx in np.flatnonzero(dirty).tolist():
+            leaves[idx].dirty = True
+        self.arrays["dirty"][rows, 0] = 0
+        return
+
+    def close(self):
+        for shm in self.shms.values():
+            shm.close()
+            shm.unlink()
+        self.shms.clear()
+        self.arrays.clear()
+        return
+
+# =========================================================
+# Worker side
+# =========================================================
+
+_attached = {} # shared memory name -> SharedMemory, per worker process
+
+def _attach(names, capacity):
+    arrays = {}
+    for field, shm_name in names.items():
+        shm = _attached.get(shm_name)
+        if shm is None:
+            # drop segments of a previous allocation
+            for old in list(_attached):
+                if old not in names.values():
+                    _attached.pop(old).close()
+            shm = shared_memory.SharedMemory(name=shm_name)
+            _attached[shm_name] = shm
+        dtype, cols = LEAF_FIELDS[field]
+        arrays[field] = np.ndarray((capacity, cols), dtype=dtype, buffer=shm.buf)
+    return arrays
+
+def perturb_range(arrays, start, end, seed, timestep, purpose, perturbation, shape=None):
+    """
+    Vectorized Block.perturb over leaves [start, end) with the counter-based RNG.
+    With a shape, only the leaves whose border the shape crosses are perturbed.
+    Produces exactly the values of the per-block code path.
+    """
+    if end <= start:
+        return 0
+    rows = np.arange(start, end)
+    if shape is not None:
+        xmin, xmax, ymin, ymax = arrays["bounds"][start:end].T
+        rows = rows[shape.border_crosses_batch(timestep, xmin, xmax, ymin, ymax)]
+        if len(rows) == 0:
+            return 0
+
+    level, i, j = arrays["coords"][rows].T
+    u = CounterRNG(seed).uniforms(level, i, j, timestep, purpose, 4)
+    lo, hi = -perturbation, perturbation
+    values = arrays["values"][rows] + (lo + (hi - lo) * u)
+    arrays["values"][rows] = np.maximum(0.0, values)
+    if perturbation != 0:
+        arrays["dirty"][rows, 0] = 1
+    return len(rows)
+
+def _perturb_task(names, capacity, start, end, seed, timestep, purpose, perturbation, shape):
+    arrays = _attach(names, capacity)
+    return perturb_range(arrays, start, end, seed, timestep, purpose, perturbation, shape)
+
+# =========================================================
+# Executor
+# =========================================================
+
+class PartitionedExecutor:
+    """
+    Runs the per-leaf phases of a Simulation over SFC partitions in worker processes.
+
+    rebalance_every: recompute the root-to-worker assignment from the current leaf
+    counts every this many timesteps (at the first phase of the step); in between,
+    workers keep their root ranges even if the refinement around the moving shape
+    makes them uneven.
+    """
+
+    def __init__(self, sim, workers=None, rebalance_every=1):
+        self.sim             = sim
+        self.workers         = workers or os.cpu_count() or 1
+        self.rebalance_every = max(1, rebalance_every)
+        self.balanced_at     = None # timestep of the last rebalance
+        self.cuts            = None
+        self.leaves          = SharedLeaves()
+        self.blocks          = []    # leaves of the shared rows, in row order
+        self.rows            = {}    # id(block) -> row, for the blocks whose values are in the rows
+        self.stale           = False # a phase ran since the last sync
+        self.pool            = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        self.roots           = None
+
+    def partition(self):
+        """
+        Leaves in SFC order and the [start, end) leaf range of every worker.
+        """
+        if self.roots is None:
+            self.roots = sfc_roots(self.sim.mesh)
+        leaves, counts = leaves_by_root(self.roots)
+        timestep = self.sim.timestep
+        if self.cuts is None or (timestep != self.balanced_at and timestep % self.rebalance_every == 0):
+            self.cuts = split_roots(counts, self.workers)
+            self.balanced_at = timestep
+        return leaves, leaf_ranges(counts, self.cuts)
+
+    def imbalance(self):
+        """
+        Largest worker load over the mean load for the current assignment (1.0 is perfect).
+        """
+        _, counts = leaves_by_root(self.roots or sfc_roots(self.sim.mesh))
+        loads = np.array([end - start for start, end in leaf_ranges(counts, self.cuts)], dtype=np.float64)
+        return float(loads.max() / loads.mean()) if loads.sum() else 1.0
+
+    def __place(self, leaves):
+        """
+        Re-lay the shared rows out for `leaves` (SFC order) after topology changes.
+        """
+        rows = self.rows
+        old = np.fromiter((rows.get(id(b), -1) for b in leaves), dtype=np.int64, count=len(leaves))
+        if len(old) == len(rows) == self.leaves.count and np.array_equal(old, np.arange(len(old))):
+            return # same leaves as the rows
+        self.leaves.place(leaves, old)
+        self.blocks = leaves
+        self.rows = {id(b): k for k, b in enumerate(leaves)}
+        return
+
+    def fetch(self, block):
+        """
+        Bring `block` up to date from its row before the topology changes it;
+        it is no longer resident afterwards.
+        """
+        row = self.rows.pop(id(block), None)
+        if row is not None and self.stale:
+            self.leaves.store([block], np.array([row]))
+        return
+
+    def sync(self):
+        """
+        Write the rows of all resident leaves back into their blocks.
+        """
+        if not self.stale:
+            return
+        rows = np.fromiter(self.rows.values(), dtype=np.int64, count=len(self.rows))
+        self.leaves.store([self.blocks[k] for k in rows.tolist()], rows)
+        self.stale = False
+        return
+
+    def perturb(self, perturbation, purpose, shape=None):
+        leaves, ranges = self.partition()
+        self.__place(leaves)
+        args = (self.sim.seed, self.sim.timestep, purpose, perturbation, shape)
+
+        if self.pool is None:
+            for start, end in ranges:
+                perturb_range(self.leaves.arrays, start, end, *args)
+        else:
+            names, capacity = self.leaves.names(), self.leaves.capacity
+            futures = [self.pool.submit(_perturb_task, names, capacity, start, end, *args)
+                       for start, end in ranges if end > start]
+            for f in futures:
+                f.result()
+
+        self.stale = True
+        return
+
+    def close(self):
+        self.sync()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        self.leaves.close()
+        return
@@ -0,0 +1,143 @@
+'''
+Region annotations for the simulation.
+
+A RegionProfiler records a call tree of named regions, similar to Caliper's
+CALI_MARK_BEGIN/END annotations in the C++ dedup code. Every node of the tree
+keeps its call count and inclusive time; exclusive time is the inclusive time
+minus that of the children. Direct recursion into the same region (e.g.
+do_refinement descending the quadtree) is folded into one node.
+
+The tree is exported as a hatchet "literal" JSON file, which Thicket reads with
+Thicket.from_literal, so analysis/thicket_tree.py renders simulation profiles
+the same way as the .cali profiles of the dedup runs.
+'''
+
+import json
+import functools
+import time
+
+class RegionNode:
+    def __init__(self, name, parent=None):
+        self.name      = name
+        self.parent    = parent
+        self.children  = {}
+        self.count     = 0
+        self.inclusive = 0.0
+
+    def child(self, name):
+        node = self.children.get(name)
+        if node is None:
+            node = RegionNode(name, self)
+            self.children[name] = node
+        return node
+
+    @property
+    def exclusive(self):
+        return self.inclusive - sum(c.inclusive for c in self.children.values())
+
+    def to_literal(self):
+        return {
+            "frame": {"name": self.name, "type": "region"},
+            "metrics": {
+                "time (inc)": self.inclusive,
+                "time": self.exclusive,
+                "count": self.count,
+            },
+            "children": [c.to_literal() for c in self.children.values()],
+        }
+
+class RegionProfiler:
+    """
+    Nested wall-clock region timer.
+
+    profiler.begin("step") ... profiler.end("step"), or
+    with profiler.region("step"): ...
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.root  = RegionNode("<root>")
+        self.stack = [] # (node, start time, recursion depth)
+
+    def begin(self, name):
+        if self.stack and self.stack[-1][0].name == name:
+            node, start, depth = self.stack[-1]
+            self.stack[-1] = (node, start, depth + 1)
+            return
+
+        parent = self.stack[-1][0] if self.stack else self.root
+        self.stack.append((parent.child(name), self.clock(), 0))
+        return
+
+    def end(self, name):
+        if not self.stack or self.stack[-1][0].name != name:
+            open_name = self.stack[-1][0].name if self.stack else None
+            raise RuntimeError(f"Region end mismatch: ending {name!r} while {open_name!r} is open.")
+
+        node, start, depth = self.stack[-1]
+        if depth > 0:
+            self.stack[-1] = (node, start, depth - 1)
+            return
+
+        self.stack.pop()
+        node.inclusive += self.clock() - start
+        node.count += 1
+        return
+
+    def region(self, name):
+        return _Region(self, name)
+
+    def to_literal(self):
+        return [c.to_literal() for c in self.root.children.values()]
+
+    def write(self, filename):
+        """
+        Write the profile as hatchet literal JSON (Thicket.from_literal).
+        """
+        with open(filename, "w") as f:
+            json.dump(self.to_literal(), f, indent=1)
+        return
+
+    def format_tree(self):
+        lines = [f"{'time (inc)':>12} {'time':>12} {'count':>8}  region"]
+
+        def visit(node, depth):
+            lines.append(f"{node.inclusive:12.6f} {node.exclusive:12.6f} {node.count:8d}  {'  ' * depth}{node.name}")
+            for child in node.children.values():
+                visit(child, depth + 1)
+
+        for node in self.root.children.values():
+            visit(node, 0)
+        return "\n".join(lines)
+
+class _Region:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name     = name
+
+    def __enter__(self):
+        self.profiler.begin(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.end(self.name)
+        return False
+
+def annotate(name):
+    """
+    Method decorator: time the call as region `name` of `self.profiler`.
+    Does nothing when the object has no profiler (profiler is None).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            profiler = self.profiler
+            if profiler is None:
+                return fn(self, *args, **kwargs)
+            profiler.begin(name)
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                profiler.end(name)
+        return wrapper
+    return decorator
@@ -0,0 +1,359 @@
+'''
+Precomputed refinement schedules.
+
+The mesh topology of a run (which blocks refine and coarsen, and when) depends
+only on the shapes, the root grid and the refinement cap, not on the random
+values. A Schedule stores it per step as three parts:
+  shape ops    refine/coarsen operations of __do_refinement, in call order
+  hits         indices (into Simulation.leaves) of the leaves the shapes cross
+  enforce ops  refine operations of the 2:1 balance enforcement, in call order
+Every operation is (op, level, i, j) with the block's stable coordinates
+(Block.coords). Replaying them in order against the same initial mesh rebuilds
+the same quadtree, with the same leaf order, without any geometric test.
+
+plan_schedule computes a schedule with a value-free mesh (no random draws) and
+load_or_plan caches it on disk, keyed by the shapes' geometry and the mesh
+parameters, so runs that share a path (e.g. a perturbation sweep) plan it once.
+The topology functions below are the ones Simulation itself runs.
+
+A run can also record its own topology (Simulation(record_topology=...)); the
+file is a Schedule as well, so later runs replay it (schedule=<file>) with
+other values, perturbations or payload dtypes, or check that they still evolve
+the mesh the same way (verify_topology=<file>, compare_schedules, or
+`python schedule.py <expected.npz> <actual.npz>`).
+'''
+
+import os
+import sys
+import json
+import pickle
+import hashlib
+import numpy as np
+from block import Block
+from shape import ShapeIndex
+
+OP_REFINE  = 0
+OP_COARSEN = 1
+
+SCHEDULE_CACHE_DIR = os.environ.get(
+    "SCHEDULE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "dynamic_chunking", "schedules"))
+
+# =========================================================
+# Topology
+#
+# `mesh` is anything with mesh, leaves, timestep and max_refinement: a
+# Simulation, or the value-free _TopologyMesh of the planner. `ops`, when
+# given, receives every refine/coarsen as (op, level, i, j).
+# =========================================================
+
+def do_refinement(mesh, block, shape, ops=None) -> bool:
+    """
+    Depth-first refinement / coarsening.
+
+    Returns
+    -------
+    bool
+        True  – this block (or one of its descendants) intersects the
+                shape’s border → keep it (and its parents) refined.
+        False – no intersection anywhere below → the whole subtree can be
+                collapsed into this block.
+    """
+    # leaf block
+    if block.active:
+        intersects = shape.border_crosses(mesh.timestep, block)
+
+        # refine only if we need more resolution and*we are still below the refinement cap
+        if intersects and block.level < mesh.max_refinement:
+            if ops is not None:
+                ops.append((OP_REFINE, *block.coords()))
+            block.refine()
+
+            # fall through: handle the children right away
+            x = False
+            for child in block.children:
+                x = do_refinement(mesh, child, shape, ops) or x
+            return x
+
+        # leaf stays as-is
+        return intersects
+
+    # internal node
+    # recurse on the existing children
+    child_hits = [do_refinement(mesh, child, shape, ops) for child in block.children]
+    any_hit   = any(child_hits)
+
+    all_leaf_children = all(child.active for child in block.children)
+    if not any_hit and all_leaf_children:
+        if ops is not None:
+            ops.append((OP_COARSEN, *block.coords()))
+        block.coarsen()
+        return False
+
+    return any_hit
+
+def enforce_refinement(mesh, ops=None):
+    """
+    Refine neighbors until no leaf is more than one level coarser than a leaf it touches.
+    """
+    for _ in range(mesh.max_refinement):
+
+        for leaf in mesh.leaves:
+            neighbors = block_neighbors(mesh, leaf)
+            for n in neighbors:
+                if n.level < leaf.level - 1:
+                    if ops is not None:
+                        ops.append((OP_REFINE, *n.coords()))
+                    n.refine()
+    return
+
+def block_neighbors(mesh, block):
+    """
+    Get the neighbors of a block in the mesh.
+    """
+    neighbors = []
+    for blk in mesh.leaves:
+        if blk != block and blk.active:
+            if (blk.xmin <= block.xmax and blk.xmax >= block.xmin and
+                blk.ymin <= block.ymax and blk.ymax >= block.ymin):
+                neighbors.append(blk)
+    return neighbors
+
+def leaf_bounds(leaves):
+    """
+    (xmin, xmax, ymin, ymax) arrays of `leaves`.
+    """
+    return np.array([(b.xmin, b.xmax, b.ymin, b.ymax) for b in leaves], dtype=np.float64).reshape(-1, 4).T
+
+def find_block(mesh, level, i, j):
+    """
+    The block at (level, i, j), found by descending from its root.
+    """
+    block = mesh.mesh[j >> level][i >> level]
+    for k in range(level - 1, -1, -1):
+        if block.active:
+            raise ValueError(f"Schedule does not match the mesh: no block at level {level}, ({i}, {j}).")
+        block = block.children[((j >> k) & 1) * 2 + ((i >> k) & 1)]
+    return block
+
+def replay_ops(mesh, ops):
+    """
+    Apply recorded operations (rows of op, level, i, j) in order.
+    """
+    for op, level, i, j in ops.tolist():
+        block = find_block(mesh, level, i, j)
+        if op == OP_REFINE:
+            block.refine()
+        else:
+            block.coarsen()
+    return
+
+# =========================================================
+# Schedule
+# =========================================================
+
+class Schedule:
+    """
+    Per-step topology operations and shape hits of a run (see module docstring).
+
+    ops:       (n, 4) int32 rows of (op, level, i, j) for all steps
+    op_starts: (steps, 3) start of the shape ops, start of the enforce ops and
+               end of the step in `ops`
+    hits:      int32 leaf indices for all steps
+    hit_starts:(steps + 1,) offsets of every step in `hits`
+    params:    mesh parameters the schedule applies to (size, max_refinement,
+               uniform_refinement)
+    """
+
+    def __init__(self, ops, op_starts, hits, hit_starts, key="", params=None):
+        self.ops        = np.asarray(ops, dtype=np.int32).reshape(-1, 4)
+        self.op_starts  = np.asarray(op_starts, dtype=np.int64).reshape(-1, 3)
+        self.hits       = np.asarray(hits, dtype=np.int32)
+        self.hit_starts = np.asarray(hit_starts, dtype=np.int64)
+        self.key        = key
+        self.params     = params or {}
+
+    def __len__(self):
+        return len(self.op_starts)
+
+    def step(self, timestep):
+        """
+        (shape ops, hits, enforce ops) of `timestep`.
+        """
+        if timestep >= len(self):
+            raise ValueError(f"Schedule covers {len(self)} steps, step {timestep} requested.")
+        a, b, c = self.op_starts[timestep]
+        h0, h1 = self.hit_starts[timestep], self.hit_starts[timestep + 1]
+        return self.ops[a:b], self.hits[h0:h1], self.ops[b:c]
+
+    @classmethod
+    def from_steps(cls, steps, key="", params=None):
+        """
+        Build from a list of (shape ops, hits, enforce ops) per step.
+        """
+        ops, hits, op_starts, hit_starts = [], [], [], [0]
+        for shape_ops, step_hits, enforce_ops in steps:
+            a = len(ops)
+            ops.extend(shape_ops)
+            b = len(ops)
+            ops.extend(enforce_ops)
+            op_starts.append((a, b, len(ops)))
+            hits.extend(step_hits)
+            hit_starts.append(len(hits))
+        return cls(ops, op_starts, hits, hit_starts, key, params)
+
+    def check_params(self, **params):
+        """
+        Raise ValueError if the schedule was made for other mesh parameters.
+        """
+        for name, value in params.items():
+            if name in self.params and self.params[name] != value:
+                raise ValueError(f"Schedule was made for {name}={self.params[name]}, not {value}.")
+        return
+
+    def save(self, filename):
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        tmp = filename + f".{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp, ops=self.ops, op_starts=self.op_starts, hits=self.hits,
+                            hit_starts=self.hit_starts, key=np.array(self.key),
+                            params=np.array(json.dumps(self.params)))
+        os.replace(tmp, filename)
+        return
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as f:
+            params = json.loads(str(f["params"])) if "params" in f else {}
+            return cls(f["ops"], f["op_starts"], f["hits"], f["hit_starts"], str(f["key"]), params)
+
+    def stats(self):
+        shape_ops = int(np.sum(self.op_starts[:, 1] - self.op_starts[:, 0]))
+        return {
+            "steps":       len(self),
+            "shape_ops":   shape_ops,
+            "enforce_ops": len(self.ops) - shape_ops,
+            "hits":        len(self.hits),
+        }
+
+def compare_schedules(expected, actual):
+    """
+    None if both schedules describe the same topology, otherwise a message
+    about the first step where they differ.
+    """
+    for t in range(min(len(expected), len(actual))):
+        for part, a, b in zip(("shape ops", "shape hits", "enforce ops"), expected.step(t), actual.step(t)):
+            if not np.array_equal(a, b):
+                n = min(len(a), len(b))
+                rows = np.flatnonzero(np.any((a[:n] != b[:n]).reshape(n, -1), axis=1))
+                k = int(rows[0]) if len(rows) else n
+                return f"step {t}: {part} differ from entry {k} ({len(a)} expected, {len(b)} actual)"
+    if len(expected) != len(actual):
+        return f"{len(expected)} steps expected, {len(actual)} actual"
+    return None
+
+# =========================================================
+# Planner
+# =========================================================
+
+class _ZeroRNG:
+    """
+    Stand-in block_rng for the planner: topology does not depend on values.
+    """
+
+    def uniform4(self, block, purpose, lows, highs):
+        return (0.0, 0.0, 0.0, 0.0)
+
+class _TopologyMesh:
+    """
+    The parts of a Simulation the Blocks and the topology functions use.
+    """
+
+    def __init__(self, size, max_refinement):
+        self.block_rng      = _ZeroRNG()
+        self.block_pool     = None
+        self.executor       = None
+        self.timestep       = 0
+        self.max_refinement = max_refinement
+        self.leaves         = []
+
+        # same bounds as Simulation.__initialize_mesh
+        step_size = 1.0 / size
+        self.mesh = [[Block(self, c * step_size, (c + 1) * step_size, r * step_size, (r + 1) * step_size)
+                      for c in range(size)] for r in range(size)]
+        self.leaves = [block for row in self.mesh for block in row]
+
+def schedule_key(shapes, size, max_refinement, uniform_refinement, steps):
+    """
+    Hash of everything the topology depends on: the shapes (kind, path and size
+    parameters), the root grid, the refinement cap and the number of steps.
+    """
+    desc = [(type(s).__name__, [tuple(p) for p in s.path],
+             sorted((k, v) for k, v in vars(s).items() if k not in ("path", "_geometry")))
+            for s in shapes]
+    h = hashlib.blake2b(digest_size=16)
+    h.update(pickle.dumps((desc, size, max_refinement, bool(uniform_refinement), steps), protocol=4))
+    return h.hexdigest()
+
+def schedule_params(size, max_refinement, uniform_refinement):
+    return {"size": size, "max_refinement": max_refinement, "uniform_refinement": bool(uniform_refinement)}
+
+def plan_schedule(shapes, size, max_refinement, steps, uniform_refinement=False):
+    """
+    Schedule of `steps` steps for a Simulation with these shapes and parameters.
+    """
+    key = schedule_key(shapes, size, max_refinement, uniform_refinement, steps)
+    params = schedule_params(size, max_refinement, uniform_refinement)
+    plan = []
+
+    if uniform_refinement:
+        # fixed grid: no operations, hits over the cells in row-major order
+        n = size * (2 ** max_refinement)
+        rows, cols = np.divmod(np.arange(n * n, dtype=np.int64), n)
+        step_size = 1.0 / n
+        bounds = (cols * step_size, (cols + 1) * step_size, rows * step_size, (rows + 1) * step_size)
+        for t in range(steps):
+            hits = np.flatnonzero(ShapeIndex(shapes, t).border_crosses_batch(t, *bounds))
+            plan.append(([], hits, []))
+        return Schedule.from_steps(plan, key, params)
+
+    mesh = _TopologyMesh(size, max_refinement)
+    for t in range(steps):
+        mesh.timestep = t
+        shape = ShapeIndex(shapes, t)
+        shape_ops, enforce_ops = [], []
+        for row in mesh.mesh:
+            for block in row:
+                do_refinement(mesh, block, shape, shape_ops)
+        hits = np.flatnonzero(shape.border_crosses_batch(t, *leaf_bounds(mesh.leaves)))
+        enforce_refinement(mesh, enforce_ops)
+        plan.append((shape_ops, hits, enforce_ops))
+    return Schedule.from_steps(plan, key, params)
+
+def load_or_plan(shapes, size, max_refinement, steps, uniform_refinement=False, cache_dir=None):
+    """
+    plan_schedule, read from / saved to the schedule cache.
+    """
+    cache_dir = cache_dir or SCHEDULE_CACHE_DIR
+    key = schedule_key(shapes, size, max_refinement, uniform_refinement, steps)
+    filename = os.path.join(cache_dir, key + ".npz")
+    if os.path.exists(filename):
+        try:
+            return Schedule.load(filename)
+        except (OSError, ValueError, KeyError):
+            pass # unreadable entry: plan again and overwrite it
+    schedule = plan_schedule(shapes, size, max_refinement, steps, uniform_refinement)
+    schedule.save(filename)
+    return schedule
+
+if __name__ == "__main__":
+    # Regression check of a recorded topology against another recording
+    if len(sys.argv) != 3:
+        print("Usage: python schedule.py <expected.npz> <actual.npz>")
+        sys.exit(1)
+
+    expected, actual = Schedule.load(sys.argv[1]), Schedule.load(sys.argv[2])
+    diff = compare_schedules(expected, actual)
+    if diff is not None:
+        print(f"Topology differs: {diff}")
+        sys.exit(1)
+    print(f"Topology matches ({len(expected)} steps, " +
+          ", ".join(f"{k} {v}" for k, v in actual.stats().items() if k != "steps") + ")")
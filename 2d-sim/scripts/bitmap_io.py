@@ -0,0 +1,133 @@
+import os
+import sys
+import math
+import struct
+import numpy as np
+
+# =========================================================
+# Packed chunk status bitmaps
+#
+# Layout (little endian):
+#   magic   4s   b"CSBM"
+#   version B    1
+#   flags   B    bit 0 set -> payload is run-length encoded
+#   (pad)   2x
+#   nbits   Q    number of chunk statuses
+#   length  Q    payload length in bytes
+#   payload      np.packbits of the statuses, or uint32 run lengths
+#                alternating 0-runs and 1-runs (starting with a 0-run)
+# =========================================================
+
+MAGIC       = b"CSBM"
+VERSION     = 1
+FLAG_RLE    = 0x1
+HEADER      = struct.Struct("<4sBBxxQQ")
+PACKED_EXT  = ".bits"
+
+def encode_runs(bits):
+    """
+    Run lengths of a 0/1 array, alternating 0-runs and 1-runs, starting with 0s.
+    """
+    bits = np.asarray(bits, dtype=np.uint8).reshape(-1)
+    if len(bits) == 0:
+        return np.zeros(0, dtype=np.uint32)
+    change = np.flatnonzero(np.diff(bits)) + 1
+    edges = np.concatenate(([0], change, [len(bits)]))
+    runs = np.diff(edges)
+    if bits[0] == 1:
+        runs = np.concatenate(([0], runs))
+    return runs.astype(np.uint32)
+
+def decode_runs(runs, nbits):
+    values = np.arange(len(runs), dtype=np.uint8) & 1
+    bits = np.repeat(values, np.asarray(runs, dtype=np.int64))
+    if len(bits) != nbits:
+        raise ValueError(f"Run lengths cover {len(bits)} bits, expected {nbits}.")
+    return bits
+
+def write_packed_bitmap(filepath, bits, rle=None):
+    """
+    Write chunk statuses (any array of 0/1) as a packed bitmap.
+    rle=None picks whichever of packed bits or run lengths is smaller.
+    """
+    bits = np.asarray(bits, dtype=np.uint8).reshape(-1)
+    packed = np.packbits(bits)
+    if rle is None:
+        runs = encode_runs(bits)
+        rle = runs.nbytes < packed.nbytes
+    elif rle:
+        runs = encode_runs(bits)
+
+    payload = runs.astype("<u4") if rle else packed
+    flags = FLAG_RLE if rle else 0
+    with open(filepath, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, flags, len(bits), payload.nbytes))
+        payload.tofile(f)
+    return
+
+def is_packed_bitmap(filepath):
+    with open(filepath, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def load_packed_bitmap(filepath):
+    """
+    Memory-map a packed bitmap and return the flat 0/1 statuses as uint8.
+    """
+    with open(filepath, "rb") as f:
+        magic, version, flags, nbits, length = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{filepath} is not a packed bitmap.")
+    if version != VERSION:
+        raise ValueError(f"{filepath}: unsupported bitmap version {version}.")
+
+    if flags & FLAG_RLE:
+        runs = np.memmap(filepath, dtype="<u4", mode="r", offset=HEADER.size, shape=(length // 4,))
+        return decode_runs(runs, nbits)
+
+    if length == 0:
+        return np.zeros(0, dtype=np.uint8)
+    packed = np.memmap(filepath, dtype=np.uint8, mode="r", offset=HEADER.size, shape=(length,))
+    return np.unpackbits(packed, count=nbits)
+
+def load_text_bitmap(filepath):
+    """
+    Legacy format: one ASCII '0'/'1' per chunk.
+    """
+    with open(filepath, "rb") as f:
+        data = f.read().strip()
+    return np.frombuffer(data, dtype=np.uint8) - ord("0")
+
+def load_bits(filepath):
+    if is_packed_bitmap(filepath):
+        return load_packed_bitmap(filepath)
+    return load_text_bitmap(filepath)
+
+def as_square(bits, filepath=""):
+    side = int(math.isqrt(len(bits)))
+    if side * side != len(bits):
+        raise ValueError(f"{filepath} is not a square bitmap.")
+    return bits.reshape((side, side))
+
+def convert_directory(directory, remove=False):
+    """
+    Convert every legacy chunk_status_bitmap_diff_N.txt in `directory` to .bits.
+    """
+    converted = 0
+    for f in sorted(os.listdir(directory)):
+        if not (f.startswith("chunk_status_bitmap_diff_") and f.endswith(".txt")):
+            continue
+        src = os.path.join(directory, f)
+        dst = os.path.splitext(src)[0] + PACKED_EXT
+        write_packed_bitmap(dst, load_text_bitmap(src))
+        if remove:
+            os.remove(src)
+        converted += 1
+    print(f"Converted {converted} bitmaps in {directory}")
+    return converted
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python bitmap_io.py <directory> [--remove]")
+        sys.exit(1)
+
+    convert_directory(sys.argv[1], remove="--remove" in sys.argv[2:])
@@ -1,66 +1,79 @@
 import os
 import re
-import math
+import sys
+import argparse
 import numpy as np
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
-from PIL import Image
-from io import BytesIO
-import sys
+from bitmap_io import load_bits, as_square
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from animation import encode_frame, write_gif
 
 def load_bitmap_as_array(filepath):
-    with open(filepath, 'r') as f:
-        data = f.read().strip()
-    side = int(math.isqrt(len(data)))
-    if side * side != len(data):
-        raise ValueError(f"{filepath} is not a square bitmap.")
-    return np.array([int(c) for c in data]).reshape((side, side))
+    """
+    Load a chunk status bitmap as a square 2D array.
+    Reads packed .bits files (memory-mapped) as well as legacy ASCII .txt files.
+    """
+    return as_square(load_bits(filepath), filepath)
 
-def generate_gif_from_bitmaps(directory):
-    pattern = re.compile(r"chunk_status_bitmap_diff_(\d+)\.txt")
-    files = [
-        (int(m.group(1)), os.path.join(directory, f))
-        for f in os.listdir(directory)
-        if (m := pattern.fullmatch(f))
-    ]
-    files.sort()
+def find_bitmaps(directory):
+    """
+    (timestep, path) of every bitmap in `directory`, preferring .bits over .txt.
+    """
+    pattern = re.compile(r"chunk_status_bitmap_diff_(\d+)\.(txt|bits)")
+    found = {}
+    for f in os.listdir(directory):
+        if (m := pattern.fullmatch(f)):
+            timestep = int(m.group(1))
+            if timestep not in found or m.group(2) == "bits":
+                found[timestep] = os.path.join(directory, f)
+    return sorted(found.items())
 
-    if not files:
-        raise ValueError(f"No matching files found in directory: {directory}")
+def render_bitmap_frame(timestep, filepath, duration, dpi=100, scale=None):
+    """
+    Render one bitmap and encode it as a GIF frame. Runs in a worker process.
+    """
+    bitmap_array = load_bitmap_as_array(filepath)
+
+    # Fixed canvas (no tight bbox) so every frame has the same pixel size
+    fig, ax = plt.subplots(figsize=(6, 6))
+    ax.imshow(bitmap_array, cmap='Greys', interpolation='nearest')
+    ax.set_title(f"Timestep {timestep}")
+    ax.axis('off')
+    fig.tight_layout(pad=0.5)
+    fig.set_dpi(dpi)
+    fig.canvas.draw()
+    frame = np.asarray(fig.canvas.buffer_rgba())[:, :, :3]
+    plt.close(fig)
 
-    frames = []
-    for timestep, filepath in files:
-        bitmap_array = load_bitmap_as_array(filepath)
+    return encode_frame(frame, duration, scale)
 
-        # Plot using matplotlib and save to memory buffer
-        fig, ax = plt.subplots(figsize=(6, 6))
-        ax.imshow(bitmap_array, cmap='Greys', interpolation='nearest')
-        ax.set_title(f"Timestep {timestep}")
-        ax.axis('off')
+def generate_gif_from_bitmaps(directory, workers=None, dpi=100, scale=None):
+    """
+    Render every bitmap in `directory` into bitmap.gif.
+    Frames are rendered in a process pool and streamed to the GIF in order.
+    """
+    files = find_bitmaps(directory)
 
-        buf = BytesIO()
-        plt.savefig(buf, format='png', bbox_inches='tight', pad_inches=0)
-        buf.seek(0)
-        frames.append(Image.open(buf).convert("RGB"))
-        plt.close(fig)
+    if not files:
+        raise ValueError(f"No matching files found in directory: {directory}")
 
-    frame_duration = 1000 // len(frames) * 2  # Duration in milliseconds
+    frame_duration = 1000 // len(files) * 2  # Duration in milliseconds
 
     output_gif = os.path.join(directory, "bitmap.gif")
 
-    # Save to GIF
-    frames[0].save(
-        output_gif,
-        save_all=True,
-        append_images=frames[1:],
-        duration=frame_duration,
-        loop=0
-    )
+    tasks = ((timestep, filepath, frame_duration, dpi, scale) for timestep, filepath in files)
+    write_gif(output_gif, render_bitmap_frame, tasks, frame_duration, workers=workers)
     print(f"Saved GIF to {output_gif}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python bitmap_gif_generator.py <directory>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Render chunk status bitmaps into an animated GIF.")
+    parser.add_argument("directory", help="Directory containing chunk_status_bitmap_diff_N files.")
+    parser.add_argument("--workers", type=int, default=None, help="Render processes (default: all cores).")
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument("--scale", type=float, default=None, help="Downscale frames before encoding.")
+    args = parser.parse_args()
 
-    directory = sys.argv[1]
-    generate_gif_from_bitmaps(directory)
+    generate_gif_from_bitmaps(args.directory, args.workers, args.dpi, args.scale)
@@ -1,9 +1,13 @@
 import os
 import re
 import sys
+import argparse
 from PIL import Image
 
-def main(image_dir):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from animation import encode_file, write_gif
+
+def main(image_dir, workers=None, scale=None):
     # Regex pattern for matching mesh_<timestep>.png
     pattern = re.compile(r"mesh_(\d+)\.png")
 
@@ -29,26 +33,26 @@ def main(image_dir):
     #Set frame duration based on the number of frames
     frame_duration_ms = 1000 // len(image_paths)  # 1000 ms = 1 second
 
-    # Open images
-    frames = [Image.open(path) for path in image_paths]
+    # Every frame is resized to the (scaled) size of the first one; only the
+    # header of the first image is read here
+    with Image.open(image_paths[0]) as first:
+        width, height = first.size
+    if scale is not None:
+        width, height = max(1, round(width * scale)), max(1, round(height * scale))
 
     output_gif = os.path.join(image_dir, "simulation.gif")
 
-    # Save as animated GIF
-    frames[0].save(
-        output_gif,
-        save_all=True,
-        append_images=frames[1:],
-        duration=frame_duration_ms,
-        loop=0
-    )
+    # Decode, downscale and encode in worker processes, streamed in order
+    tasks = ((path, frame_duration_ms, scale, (width, height)) for path in image_paths)
+    write_gif(output_gif, encode_file, tasks, frame_duration_ms, workers=workers)
 
     print(f"GIF saved as {output_gif}")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python make_gif.py <image_directory>")
-        sys.exit(1)
-    
-    image_dir = sys.argv[1]
-    main(image_dir)
+    parser = argparse.ArgumentParser(description="Combine mesh_<timestep>.png images into an animated GIF.")
+    parser.add_argument("image_dir", help="Directory containing mesh_<timestep>.png images.")
+    parser.add_argument("--workers", type=int, default=None, help="Encoding processes (default: all cores).")
+    parser.add_argument("--scale", type=float, default=None, help="Downscale frames before encoding.")
+    args = parser.parse_args()
+
+    main(args.image_dir, args.workers, args.scale)
@@ -1,8 +1,75 @@
+import abc
 import math
+import numpy as np
 
-class Shape:
+# =========================================================
+# Shape kernels
+#
+# A shape moves along `path` (one center per timestep) and answers, for arrays of
+# block bounds (xmin, xmax, ymin, ymax):
+#   intersects_batch : the block and the shape share a point
+#   contains_batch   : the block lies strictly inside the shape
+# border_crosses_batch (the shape's border passes through the block) follows
+# from those two, and the scalar border_crosses from the batched version, so a
+# new shape only implements the abstract compute_geometry(), bbox() and the two
+# batched kernels (Shape cannot be instantiated without them).
+# Per-timestep geometry (absolute corners, edge normals, ...) is computed once
+# per timestep and cached.
+# =========================================================
+
+class Shape(abc.ABC):
     def __init__(self, path):
         self.path = path
+        self._geometry = {}
+
+    def center(self, timestep):
+        return self.path[timestep]
+
+    def geometry(self, timestep):
+        """
+        Geometry of the shape at `timestep`, as returned by compute_geometry (cached).
+        """
+        g = self._geometry.get(timestep)
+        if g is None:
+            cx, cy = self.path[timestep]
+            g = self._geometry[timestep] = self.compute_geometry(cx, cy)
+        return g
+
+    @abc.abstractmethod
+    def compute_geometry(self, cx, cy):
+        """
+        Geometry of the shape centered at (cx, cy).
+        """
+
+    @abc.abstractmethod
+    def bbox(self, timestep):
+        """
+        (xmin, xmax, ymin, ymax) of the shape at `timestep`.
+        """
+
+    @abc.abstractmethod
+    def intersects_batch(self, timestep, xmin, xmax, ymin, ymax, eps=1e-12):
+        """
+        True where the block and the shape share a point.
+        """
+
+    @abc.abstractmethod
+    def contains_batch(self, timestep, xmin, xmax, ymin, ymax, eps=1e-12):
+        """
+        True where the block lies strictly inside the shape.
+        """
+
+    def border_crosses_batch(self, timestep, xmin, xmax, ymin, ymax, eps=1e-12):
+        """
+        True where the border of the shape crosses the block: the block
+        intersects the shape without lying strictly inside it.
+        """
+        return (self.intersects_batch(timestep, xmin, xmax, ymin, ymax, eps)
+                & ~self.contains_batch(timestep, xmin, xmax, ymin, ymax, eps))
+
+    def border_crosses(self, timestep, block, eps=1e-12) -> bool:
+        bounds = (np.array([block.xmin]), np.array([block.xmax]), np.array([block.ymin]), np.array([block.ymax]))
+        return bool(self.border_crosses_batch(timestep, *bounds, eps)[0])
 
 class Circle(Shape):
     def __init__(self, path, radius):
@@ -10,12 +77,19 @@ class Circle(Shape):
         self.r = radius
         self.r2 = radius * radius
 
+    @classmethod
+    def from_scale(cls, path, scale, rng):
+        return cls(path, scale)
+
     def circumference(self):
         return 2 * math.pi * self.r
 
     def area(self):
         return math.pi * self.r * self.r
 
+    def compute_geometry(self, cx, cy):
+        return cx, cy
+
     def border_crosses(self, timestep, block, eps=1e-12) -> bool:
         """
         True  → circumference intersects the block (touches interior).
@@ -39,6 +113,274 @@ class Circle(Shape):
         dmax2 = max((cx - x) ** 2 + (cy - y) ** 2 for x, y in corners)
 
         return dmin2 <= self.r2 + eps and dmax2 >= self.r2 - eps
-    
-    def center(self, timestep):
-        return self.path[timestep]
\ No newline at end of file
+
+    def intersects_batch(self, timestep, xmin, xmax, ymin, ymax, eps=1e-12):
+        cx, cy = self.geometry(timestep)
+
+        # closest point on each block to the centre
+        nx = np.minimum(np.maximum(cx, xmin), xmax)
+        ny = np.minimum(np.maximum(cy, ymin), ymax)
+        return (cx - nx) ** 2 + (cy - ny) ** 2 <= self.r2 + eps
+
+    def contains_batch(self, timestep, xmin, xmax, ymin, ymax, eps=1e-12):
+        cx, cy = self.geometry(timestep)
+
+        # farthest corner of each block from the centre
+        dmax2 = np.maximum.reduce([
+            (cx - xmin) ** 2 + (cy - ymin) ** 2,
+            (cx - xmin) ** 2 + (cy - ymax) ** 2,
+            (cx - xmax) ** 2 + (cy - ymin) ** 2,
+            (cx - xmax) ** 2 + (cy - ymax) ** 2,
+        ])
+        return dmax2 < self.r2 - eps
+
+    def bbox(self, timestep):
+        """
+        (xmin, xmax, ymin, ymax) of the circle at `timestep`.
+        """
+        cx, cy = self.path[timestep]
+        return cx - self.r, cx + self.r, cy - self.r, cy + self.r
+
+class Rectangle(Shape):
+    """
+    Axis-aligned rectangle centred on the path.
+    """
+
+    def __init__(self, path, width, height):
+        super().__init__(path)
+        self.width  = width
+        self.height = height
+
+    @classmethod
+    def from_scale(cls, path, scale, rng):
+        return cls(path, 2 * scale, 2 * scale * rng.uniform(0.5, 1.0))
+
+    def compute_geometry(self, cx, cy):
+        hw, hh = self.width / 2, self.height / 2
+        return cx - hw, cx + hw, cy - hh, cy + hh
+
+    def bbox(self, timestep):
+        return self.geometry(timestep)
+
+    def intersects_batch(self, timestep, xmin, xmax, ymin, ymax, eps=1e-12):
+        x0, x1, y0, y1 = self.geometry(timestep)
+        return (xmin <= x1 + eps) & (xmax >= x0 - eps) & (ymin <= y1 + eps) & (ymax >= y0 - eps)
+
+    def contains_batch(self, timestep, xmin, xmax, ymin, ymax, eps=1e-12):
+        x0, x1, y0, y1 = self.geometry(timestep)
+        return (xmin > x0 + eps) & (xmax < x1 - eps) & (ymin > y0 + eps) & (ymax < y1 - eps)
+
+class Ellipse(Shape):
+    """
+    Axis-aligned ellipse with semi-axes a (x) and b (y), centred on the path.
+    Scaling x by 1/a and y by 1/b maps it to the unit circle and blocks to
+    blocks, so the circle kernels apply in the scaled coordinates.
+    """
+
+    def __init__(self, path, a, b):
+        super().__init__(path)
+        self.a = a
+        self.b = b
+
+    @classmethod
+    def from_scale(cls, path, scale, rng):
+        return cls(path, scale, scale * rng.uniform(0.5, 1.0))
+
+    def compute_geometry(self, cx, cy):
+        return cx, cy
+
+    def bbox(self, timestep):
+        cx, cy = self.geometry(timestep)
+        return cx - self.a, cx + self.a, cy - self.b, cy + self.b
+
+    def __scaled(self, timestep, xmin, xmax, ymin, ymax):
+        cx, cy = self.geometry(timestep)
+        return (xmin - cx) / self.a, (xmax - cx) / self.a, (ymin - cy) / self.b, (ymax - cy) / self.b
+
+    def intersects_batch(self, timestep, xmin, xmax, ymin, ymax, eps=1e-12):
+        sx0, sx1, sy0, sy1 = self.__scaled(timestep, xmin, xmax, ymin, ymax)
+        nx = np.minimum(np.maximum(0.0, sx0), sx1)
+        ny = np.minimum(np.maximum(0.0, sy0), sy1)
+        return nx ** 2 + ny ** 2 <= 1.0 + eps
+
+    def contains_batch(self, timestep, xmin, xmax, ymin, ymax, eps=1e-12):
+        sx0, sx1, sy0, sy1 = self.__scaled(timestep, xmin, xmax, ymin, ymax)
+        fx = np.maximum(sx0 ** 2, sx1 ** 2)
+        fy = np.maximum(sy0 ** 2, sy1 ** 2)
+        return fx + fy < 1.0 - eps
+
+class ConvexPolygon(Shape):
+    """
+    Convex polygon given by its vertices relative to the path point.
+
+    Inside is the intersection of the half-planes n_k . p <= c_k of its edges.
+    A block intersects the polygon unless a separating axis exists among the
+    block's axes (bounding boxes) and the edge normals; it lies inside when its
+    farthest corner along every edge normal is inside.
+    """
+
+    def __init__(self, path, vertices):
+        super().__init__(path)
+        v = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+        # counter-clockwise, so the edge normals below point outwards
+        area2 = np.sum(v[:, 0] * np.roll(v[:, 1], -1) - np.roll(v[:, 0], -1) * v[:, 1])
+        self.vertices = v if area2 >= 0 else v[::-1].copy()
+
+    @classmethod
+    def from_scale(cls, path, scale, rng):
+        # points on a circle in angular order always form a convex polygon
+        n = rng.randint(3, 7)
+        start = rng.uniform(0, 2 * math.pi)
+        angles = [start + 2 * math.pi * (k + rng.uniform(-0.3, 0.3)) / n for k in range(n)]
+        return cls(path, [(scale * math.cos(t), scale * math.sin(t)) for t in angles])
+
+    def compute_geometry(self, cx, cy):
+        v = self.vertices + (cx, cy)
+        edges = np.roll(v, -1, axis=0) - v
+        normals = np.stack([edges[:, 1], -edges[:, 0]], axis=1)
+        normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+        offsets = np.einsum("ij,ij->i", normals, v)
+        box = (v[:, 0].min(), v[:, 0].max(), v[:, 1].min(), v[:, 1].max())
+        return normals, offsets, box
+
+    def bbox(self, timestep):
+        return self.geometry(timestep)[2]
+
+    @staticmethod
+    def __projections(normals, xmin, xmax, ymin, ymax):
+        """
+        Min and max of every block's projection on every normal, shape (blocks, edges).
+        """
+        nx = normals[:, 0]
+        ny = normals[:, 1]
+        ax, bx = np.multiply.outer(xmin, nx), np.multiply.outer(xmax, nx)
+        ay, by = np.multiply.outer(ymin, ny), np.multiply.outer(ymax, ny)
+        lo = np.minimum(ax, bx) + np.minimum(ay, by)
+        hi = np.maximum(ax, bx) + np.maximum(ay, by)
+        return lo, hi
+
+    def intersects_batch(self, timestep, xmin, xmax, ymin, ymax, eps=1e-12):
+        normals, offsets, (x0, x1, y0, y1) = self.geometry(timestep)
+        overlap = (xmin <= x1 + eps) & (xmax >= x0 - eps) & (ymin <= y1 + eps) & (ymax >= y0 - eps)
+        lo, _ = self.__projections(normals, xmin, xmax, ymin, ymax)
+        return overlap & np.all(lo <= offsets + eps, axis=-1)
+
+    def contains_batch(self, timestep, xmin, xmax, ymin, ymax, eps=1e-12):
+        normals, offsets, _ = self.geometry(timestep)
+        _, hi = self.__projections(normals, xmin, xmax, ymin, ymax)
+        return np.all(hi < offsets - eps, axis=-1)
+
+# Shape kinds selectable by name (Simulation(shape_kinds=...))
+SHAPE_KINDS = {
+    "circle":    Circle,
+    "rectangle": Rectangle,
+    "ellipse":   Ellipse,
+    "polygon":   ConvexPolygon,
+}
+
+def make_shape(kind, path, scale, rng):
+    """
+    A shape of the given kind whose size is on the order of `scale` (a radius);
+    the proportions are drawn from `rng`.
+    """
+    if kind not in SHAPE_KINDS:
+        raise ValueError(f"Unknown shape kind: {kind} (known: {', '.join(SHAPE_KINDS)})")
+    return SHAPE_KINDS[kind].from_scale(path, scale, rng)
+
+class ShapeIndex:
+    """
+    Bounding-box grid over the unit square for the shapes of one timestep.
+
+    Every cell lists the shapes whose bounding box overlaps it, so a block only
+    tests the shapes near it. The index answers border_crosses and
+    border_crosses_batch like a single shape does, for the union of all shapes:
+    a block crosses if the border of any shape crosses it.
+    """
+
+    MARGIN = 1e-9 # widen boxes so the eps tolerance of the exact tests is covered
+    SCAN_SHAPES = 8 # up to this many shapes, scanning all blocks per shape beats binning them
+
+    def __init__(self, shapes, timestep, cells=None):
+        self.shapes   = list(shapes)
+        self.timestep = timestep
+        self.cells    = cells or max(1, math.ceil(math.sqrt(len(self.shapes))) * 2)
+        self.boxes    = np.array([s.bbox(timestep) for s in self.shapes], dtype=np.float64).reshape(-1, 4)
+        self.boxes[:, [0, 2]] -= self.MARGIN
+        self.boxes[:, [1, 3]] += self.MARGIN
+
+        n = self.cells
+        self.grid = [[[] for _ in range(n)] for _ in range(n)]
+        for k, (xmin, xmax, ymin, ymax) in enumerate(self.boxes):
+            for cy in range(self.__cell(ymin), self.__cell(ymax) + 1):
+                for cx in range(self.__cell(xmin), self.__cell(xmax) + 1):
+                    self.grid[cy][cx].append(k)
+
+    def __cell(self, v):
+        return min(self.cells - 1, max(0, int(v * self.cells)))
+
+    def __check(self, timestep):
+        if timestep != self.timestep:
+            raise ValueError(f"ShapeIndex built for timestep {self.timestep}, queried for {timestep}.")
+
+    def candidates(self, xmin, xmax, ymin, ymax):
+        """
+        Indices of the shapes whose bounding box overlaps the given box.
+        """
+        found = set()
+        for cy in range(self.__cell(ymin), self.__cell(ymax) + 1):
+            for cx in range(self.__cell(xmin), self.__cell(xmax) + 1):
+                found.update(self.grid[cy][cx])
+        b = self.boxes
+        return sorted(k for k in found
+                      if b[k, 0] <= xmax and b[k, 1] >= xmin and b[k, 2] <= ymax and b[k, 3] >= ymin)
+
+    def border_crosses(self, timestep, block):
+        self.__check(timestep)
+        for k in self.candidates(block.xmin, block.xmax, block.ymin, block.ymax):
+            if self.shapes[k].border_crosses(timestep, block):
+                return True
+        return False
+
+    def __cells(self, v):
+        return np.clip(np.floor(v * self.cells), 0, self.cells - 1).astype(np.int64)
+
+    def __bin(self, xmin, ymin):
+        """
+        Blocks grouped by the grid cell of their lower-left corner: block indices
+        sorted by cell and the start of every cell's run (cell cy * cells + cx).
+        """
+        cell = self.__cells(ymin) * self.cells + self.__cells(xmin)
+        order = np.argsort(cell)
+        return order, np.searchsorted(cell[order], np.arange(self.cells * self.cells + 1))
+
+    def border_crosses_batch(self, timestep, xmin, xmax, ymin, ymax):
+        """
+        One pass over all blocks: the blocks are binned into the grid cells, and
+        every shape runs its batched test only on the blocks binned in the cells
+        its bounding box covers (widened by the largest block, as blocks are
+        binned by their lower-left corner) that overlap the box itself. With at
+        most SCAN_SHAPES shapes every shape scans all blocks' boxes instead.
+        """
+        self.__check(timestep)
+        xmin, xmax, ymin, ymax = (np.asarray(a, dtype=np.float64).reshape(-1) for a in (xmin, xmax, ymin, ymax))
+        hits = np.zeros(xmin.shape, dtype=bool)
+        if len(xmin) == 0 or not self.shapes:
+            return hits
+        binned = len(self.shapes) > self.SCAN_SHAPES
+        if binned:
+            blocks, starts = self.__bin(xmin, ymin)
+            width, height = float(np.max(xmax - xmin)), float(np.max(ymax - ymin))
+        n = self.cells
+        for shape, (bx0, bx1, by0, by1) in zip(self.shapes, self.boxes):
+            if binned:
+                cx0, cx1 = self.__cell(bx0 - width), self.__cell(bx1)
+                cy0, cy1 = self.__cell(by0 - height), self.__cell(by1)
+                near = np.concatenate([blocks[starts[cy * n + cx0]:starts[cy * n + cx1 + 1]]
+                                       for cy in range(cy0, cy1 + 1)])
+                near = near[(xmin[near] <= bx1) & (xmax[near] >= bx0) & (ymin[near] <= by1) & (ymax[near] >= by0)
+                            & ~hits[near]]
+            else:
+                near = np.flatnonzero((xmin <= bx1) & (xmax >= bx0) & (ymin <= by1) & (ymax >= by0) & ~hits)
+            if len(near):
+                hits[near] |= shape.border_crosses_batch(timestep, xmin[near], xmax[near], ymin[near], ymax[near])
+        return hits
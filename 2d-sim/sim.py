@@ -1,6 +1,20 @@
 import random
-from block import Block
-from shape import Circle
+import contextlib
+import numpy as np
+from block import Block, BlockPool
+from dense import DenseGrid
+from shape import SHAPE_KINDS, ShapeIndex, make_shape
+import chunking
+from compression import CompressionBaseline
+from delta import DeltaWriter, block_keys
+from animation import GifStreamWriter, FrameArchive
+from profiling import RegionProfiler, annotate
+from memory import MemorySampler, usage_filename
+from schedule import (Schedule, compare_schedules, do_refinement, enforce_refinement, leaf_bounds,
+                      load_or_plan, replay_ops, schedule_params)
+from counter_rng import CounterRNG, SequentialRNG, PERTURB, SHAPE
+from partition import PartitionedExecutor, sfc_roots, leaves_by_root, split_roots, leaf_ranges
+from concurrent.futures import ThreadPoolExecutor
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
 import matplotlib.colors as colors
@@ -18,14 +32,122 @@ class Simulation:
     The blocks are perturbed by a random value between -perturbation and perturbation.
     The blocks are refined by splitting the blocks in half in each direction, creating 4 children blocks.
     The blocks are refined by a given number of levels.
+
+    Chunking (optional) writes chunk boundaries next to every dump:
+    chunking="cdc" uses content-defined chunking, chunk_params are passed to
+    chunking.cdc_boundaries (min_size, avg_size, max_size, align).
+    chunking="amr" places boundaries on quadtree subtree edges using the mesh
+    metadata, chunk_params are passed to chunking.amr_boundaries (max_size).
+    In that mode leaves are dumped in tree (Z) order so subtrees are contiguous.
+
+    export_metadata writes a step_XXXX.meta file describing every leaf in the dump
+    (see chunking.LEAF_META_DTYPE); it is always written in "amr" mode.
+    The metadata carries a dirty flag per leaf: leaves whose values did not change
+    since the previous dump and that sit at the same offset are fixed duplicates,
+    so a dedup consumer can skip hashing the chunks made of them that were also
+    chunks of the previous dump (chunking.fixed_duplicate_chunks).
+
+    Plotting (plot=True) writes images/mesh_XXXX.png per step by default.
+    animation="gif" streams every rendered frame straight into images/simulation.gif,
+    animation="frames" appends raw RGB frames to images/frames.npy; save_png=False
+    then skips the PNGs altogether. animation_dpi sets the resolution of those frames.
+
+    profile=True times the main phases (run, step, apply_shape, do_refinement,
+    enforce_refinement, dump_simulation, plot_mesh) as nested regions and writes
+    the call tree to profile.json in the output directory at the end of run();
+    analysis/thicket_tree.py renders it like a .cali profile.
+
+    memory="steps" samples memory usage at the start and after every step into a
+    <host>-<pid>-Host.memspace_usage file in the output directory, in the format
+    of the Kokkos MemoryUsage tool; memory="thread" additionally samples every
+    memory_interval seconds from a background thread. memory_trace=False skips
+    tracemalloc (which slows the run down) and reports the resident set size only.
+
+    rng="sequential" (default) draws every block value from one random.Random in
+    visiting order. rng="counter" derives each block's draws from (seed, block
+    position, timestep, purpose) with a counter-based generator (counter_rng),
+    so results no longer depend on the order blocks are processed in.
+
+    workers=N (N > 1, requires rng="counter") splits the root grid into
+    space-filling-curve ranges and runs the perturbation and shape phases of every
+    step in N processes over shared-memory leaf arrays that stay authoritative
+    between phases (see partition); the blocks are brought up to date once per
+    step, before the dump. Refinement and balance enforcement stay serial. The
+    root ranges are recomputed from the leaf counts every rebalance_every steps.
+    Results are identical to workers=None.
+
+    ranks=N dumps every step like an N-rank miniAMR run: leaves are split across N
+    logical ranks by space-filling-curve range of their roots and each rank writes
+    dump_tsXXXX_peYYYYYY.txt (concurrently, from dump_workers threads), which
+    scripts/combine_checkpoints.py turns into checkpoint_tsXXXX.txt. Metadata and
+    chunk boundaries then describe that combined checkpoint and are written as
+    checkpoint_tsXXXX.txt.meta/.chunks in the output directory.
+
+    num_shapes sets how many circles sweep across the mesh (each with its own
+    random path; the first has radius 0.25, the others a random radius in
+    [0.1, 0.25]). Each step the shapes are put in a bounding-box grid
+    (shape.ShapeIndex), so a block only tests the shapes near it, and a block
+    is refined/perturbed when the border of any shape crosses it.
+
+    shape_kinds lists the kinds of shape to use (shape.SHAPE_KINDS: "circle",
+    "rectangle", "ellipse", "polygon"), cycled over the num_shapes shapes. The
+    radius above becomes the size of the other kinds, whose proportions are drawn
+    at random. The default ("circle",) gives the original circles.
+
+    backend="dense" (requires uniform_refinement=True) stores the uniform grid in
+    one (Nu, Nu, 4) array of dtype (dense.DenseGrid) instead of one Block per cell:
+    initialization, perturbation and the shape update are array operations and
+    every dump is a single write of the array. It draws the same random values as
+    the default backend="blocks"; with dtype=np.float64 the dumps are identical,
+    with float32 they match up to the rounding of the accumulated values. leaves
+    and mesh stay empty in this mode.
+
+    block_pool=True recycles the children released by coarsening for later
+    refinements (block.BlockPool) and skips the initial draws of children, which
+    refine overwrites anyway. The pool counts requests, allocations and reuses;
+    the counters are printed at the end of the run. With rng="counter" the results
+    are unchanged; with rng="sequential" the skipped draws shift the random stream.
+
+    schedule=True precomputes the mesh topology of the whole run from the shape
+    paths (schedule.plan_schedule: refine/coarsen operations and shape hits per
+    step), or loads it from the schedule cache when a run with the same shapes and
+    mesh parameters planned it before, and then replays it each step instead of
+    testing blocks against the shapes. A schedule.Schedule can be passed as well.
+    Results are identical to schedule=None.
+
+    record_topology=<file> saves the topology this run goes through (same format)
+    when it ends; schedule=<file> replays such a recording, so variants of a run
+    (other perturbation, seed or dtype) reuse its mesh evolution and only
+    regenerate values. verify_topology=<file> runs normally but compares every
+    step against a recording and raises ValueError at the first difference.
+
+    dtype is the type corner values are dumped as (np.float32 by default);
+    with chunking="cdc" chunk boundaries are aligned to it unless chunk_params
+    sets align.
+
+    compression="zlib" (or "lzma", "bz2", or a list of them) also compresses every
+    dump as a baseline for deduplication (compression.CompressionBaseline):
+    compression_level sets the codec level (codec default if None),
+    compression_filter a pre-filter ("shuffle", "transpose", "transpose+shuffle").
+    The codecs run in compression_workers threads alongside the simulation; size
+    and throughput per dump are written to compression.csv in the output
+    directory. compression_write=True also keeps the compressed dumps in
+    compressed/<codec>/ for scripts/storage_usage.py.
+
+    delta=True also writes every dump as an XOR delta against the previous one
+    (delta.DeltaWriter) to delta/step_XXXX.delta, blocks matched by (level, i, j),
+    with a keyframe every delta_keyframe_every dumps; delta_compress=True runs
+    the encoded streams through zlib as well. Sizes and encode throughput go to
+    delta/delta.csv; `python delta.py <dir>/delta <dir>` decodes and checks them.
     """
 
-    def __init__(self, size, seed=None, sim_length=10, perturbation=0.1, max_refinement=3, shape_affects_mesh = True, uniform_refinement=False, plot=False, output_dir="data"):
+    def __init__(self, size, seed=None, sim_length=10, perturbation=0.1, max_refinement=3, shape_affects_mesh = True, uniform_refinement=False, plot=False, output_dir="data", chunking=None, chunk_params=None, export_metadata=False, animation=None, save_png=True, animation_dpi=100, profile=False, memory=None, memory_interval=0.1, memory_trace=True, rng="sequential", workers=None, rebalance_every=1, ranks=None, dump_workers=None, num_shapes=1, shape_kinds=("circle",), backend="blocks", block_pool=False, schedule=None, record_topology=None, verify_topology=None, dtype=np.float32, compression=None, compression_level=None, compression_filter=None, compression_workers=None, compression_write=False, delta=False, delta_keyframe_every=10, delta_compress=False):
         if seed is None:
             seed = random.randint(0, 100000)
 
         self.seed                = seed
         self.rng                 = random.Random(seed)
+        self.rng_mode            = rng
         self.sim_length          = sim_length
         self.perturbation        = perturbation
         self.max_refinement      = max_refinement
@@ -38,6 +160,56 @@ class Simulation:
         self.shape_list          = []
         self.output_dir          = output_dir + "/" + str(seed) + "/"
         self.plot                = plot
+        self.chunking            = chunking
+        self.chunk_params        = chunk_params or {}
+        self.export_metadata     = export_metadata or chunking == "amr"
+        self.animation           = animation
+        self.save_png            = save_png
+        self.animation_dpi       = animation_dpi
+        self.animation_sink      = None
+        self.profiler            = RegionProfiler() if profile else None
+        self.memory              = memory
+        self.memory_sampler      = None
+        self.ranks               = ranks
+        self.dump_workers        = dump_workers
+        self.backend             = backend
+        self.grid                = None
+        self.block_pool          = BlockPool(self) if block_pool else None
+        self.dtype               = np.dtype(dtype)
+        self.record_topology     = record_topology
+        self.verify_topology     = verify_topology
+        self.topology_log        = [] if record_topology or verify_topology else None
+        self.topology_reference  = None
+        self.compressor          = None
+        self.delta_writer        = None
+
+        if self.chunking not in (None, "cdc", "amr"):
+            raise ValueError(f"Unknown chunking mode: {self.chunking}")
+        if self.animation not in (None, "gif", "frames"):
+            raise ValueError(f"Unknown animation mode: {self.animation}")
+        if self.memory not in (None, "steps", "thread"):
+            raise ValueError(f"Unknown memory sampling mode: {self.memory}")
+        if self.rng_mode == "sequential":
+            self.block_rng = SequentialRNG(self.rng)
+        elif self.rng_mode == "counter":
+            self.block_rng = CounterRNG(seed)
+        else:
+            raise ValueError(f"Unknown rng mode: {self.rng_mode}")
+        if self.ranks is not None and self.ranks < 1:
+            raise ValueError(f"ranks must be at least 1, got {self.ranks}")
+        if workers is not None and workers > 1 and self.rng_mode != "counter":
+            raise ValueError("Parallel execution (workers > 1) requires rng=\"counter\".")
+        if self.backend not in ("blocks", "dense"):
+            raise ValueError(f"Unknown backend: {self.backend}")
+        if self.backend == "dense" and not self.uniform_refinement:
+            raise ValueError("backend=\"dense\" requires uniform_refinement=True.")
+        if self.backend == "dense" and workers is not None and workers > 1:
+            raise ValueError("backend=\"dense\" is vectorized in one process; workers is not supported.")
+        if isinstance(shape_kinds, str):
+            shape_kinds = (shape_kinds,)
+        for kind in shape_kinds:
+            if kind not in SHAPE_KINDS:
+                raise ValueError(f"Unknown shape kind: {kind}")
 
         # Print simulation parameters
         print("==========================================================")
@@ -45,23 +217,77 @@ class Simulation:
         print(f"Perturbation: {self.perturbation}")
         print(f"Max refinement: {self.max_refinement}")
         print(f"Uniform refinement: {self.uniform_refinement}")
+        print(f"Backend: {self.backend}")
+        print(f"Dump dtype: {self.dtype}")
+        print(f"Compression: {compression or 'none'}")
         print(f"Output directory: {self.output_dir}")
+        print(f"Chunking: {self.chunking or 'none'}")
+        print(f"RNG: {self.rng_mode}")
+        print(f"Workers: {workers or 1}")
         print("==========================================================")
 
+        # Start sampling before anything is allocated so the mesh shows up
+        if self.memory is not None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            interval = memory_interval if self.memory == "thread" else None
+            self.memory_sampler = MemorySampler(usage_filename(self.output_dir), interval, memory_trace)
+
+        if compression:
+            self.compressor = CompressionBaseline(self.output_dir, compression, compression_level,
+                                                  compression_filter, compression_workers, compression_write)
+
+        if delta:
+            self.delta_writer = DeltaWriter(os.path.join(self.output_dir, "delta"), delta_keyframe_every,
+                                            delta_compress)
+
         # Create shapes first so they are consistent across runs
-        p = self.__generate_shape_path(sim_length)
-        self.plot_path(p)
-        self.shape_list.append(Circle(p, 0.25))
+        for k in range(num_shapes):
+            p = self.__generate_shape_path(sim_length)
+            radius = 0.25 if k == 0 else self.rng.uniform(0.1, 0.25)
+            kind = shape_kinds[k % len(shape_kinds)]
+            self.shape_list.append(make_shape(kind, p, radius, self.rng))
+        self.plot_path(*(shape.path for shape in self.shape_list))
+
+        # Plan (or load) the topology of the run
+        self.schedule = None
+        if schedule is True:
+            self.schedule = load_or_plan(self.shape_list, self.size, self.max_refinement, sim_length,
+                                         self.uniform_refinement)
+            print(f"Schedule {self.schedule.key}: " + ", ".join(f"{k} {v}" for k, v in self.schedule.stats().items()))
+        elif isinstance(schedule, str):
+            self.schedule = Schedule.load(schedule)
+            print(f"Replaying topology from {schedule}")
+        elif schedule is not None and schedule is not False:
+            self.schedule = schedule
+        if self.schedule is not None:
+            self.schedule.check_params(**self.__schedule_params())
+            if len(self.schedule) < sim_length:
+                raise ValueError(f"Schedule covers {len(self.schedule)} steps, the run has {sim_length}.")
+        if self.verify_topology is not None:
+            if self.schedule is not None:
+                raise ValueError("verify_topology checks a computed topology; it cannot be combined with schedule.")
+            self.topology_reference = Schedule.load(self.verify_topology)
+            self.topology_reference.check_params(**self.__schedule_params())
+            if len(self.topology_reference) < sim_length:
+                raise ValueError(f"Recording covers {len(self.topology_reference)} steps, the run has {sim_length}.")
 
         # Initialize the mesh
-        if not self.uniform_refinement:
+        if self.backend == "dense":
+            self.grid = DenseGrid(self.size * (2 ** self.max_refinement), self.block_rng, dtype=self.dtype)
+        elif not self.uniform_refinement:
             self.__initialize_mesh()
+            self.__initialize_leaves()
         else:
             self.__initialize_uniform_mesh()
-        self.__initialize_leaves()
+            self.__initialize_leaves()
+
+        self.executor = None
+        if workers is not None and workers > 1:
+            self.executor = PartitionedExecutor(self, workers, rebalance_every)
 
         # Plot the initial mesh
         if self.plot:
+            self.animation_sink = self.__open_animation()
             self.plot_mesh()
 
         # Run the simulation
@@ -116,88 +342,146 @@ class Simulation:
     # =========================================================
 
     def run(self):
-        while self.timestep < self.sim_length:
-            self.__step()
-            self.dump_simulation()
-            self.plot_mesh()
+        with self.__region("run"):
+            while self.timestep < self.sim_length:
+                self.__step()
+                self.dump_simulation()
+                self.plot_mesh()
+                if self.memory_sampler is not None:
+                    self.memory_sampler.sample()
+
+        if self.animation_sink is not None:
+            self.animation_sink.close()
+            print(f"Animation saved to {self.animation_sink.filename}")
+            self.animation_sink = None
+
+        if self.executor is not None:
+            self.executor.close()
+            self.executor = None
+
+        if self.compressor is not None:
+            self.compressor.close()
+            print(self.compressor.summary())
+            print(f"Compression stats saved to {os.path.join(self.output_dir, 'compression.csv')}")
+            self.compressor = None
+
+        if self.delta_writer is not None:
+            self.delta_writer.close()
+            print(self.delta_writer.summary())
+            self.delta_writer = None
+
+        if self.record_topology is not None:
+            self.write_topology()
+
+        if self.verify_topology is not None:
+            print(f"Topology matches {self.verify_topology} ({self.timestep} steps)")
+
+        if self.block_pool is not None:
+            stats = self.block_pool.stats()
+            print("Block pool: " + ", ".join(f"{k} {v}" for k, v in stats.items()))
+
+        if self.profiler is not None:
+            self.write_profile()
+
+        if self.memory_sampler is not None:
+            self.memory_sampler.close()
+            print(f"Memory high-water: {self.memory_sampler.highwater / (1024 * 1024):.1f} MB, "
+                  f"usage saved to {self.memory_sampler.filename}")
+            self.memory_sampler = None
+        return
+
+    def __region(self, name):
+        """
+        Context manager timing `name` when profiling, a no-op otherwise.
+        """
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.region(name)
+
+    def write_profile(self, filename=None):
+        """
+        Write the region profile as hatchet literal JSON and print the call tree.
+        """
+        if filename is None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            filename = os.path.join(self.output_dir, "profile.json")
+        self.profiler.write(filename)
+        print(self.profiler.format_tree())
+        print(f"Profile saved to {filename}")
         return
     
+    @annotate("step")
     def __step(self):
         self.__perturb_mesh()
-        self.__apply_shape(self.shape_list[0])
-        if not self.uniform_refinement:
-            self.__enforce_refinement()
+        if self.schedule is not None:
+            step = self.__replay_step()
+        elif self.topology_log is not None:
+            step = ([], [], [])
+            self.__apply_shape(ShapeIndex(self.shape_list, self.timestep), step[0], step[1])
+            if not self.uniform_refinement:
+                self.__enforce_refinement(step[2])
+        else:
+            self.__apply_shape(ShapeIndex(self.shape_list, self.timestep))
+            if not self.uniform_refinement:
+                self.__enforce_refinement()
+
+        if self.topology_log is not None:
+            self.__log_topology(step)
         
         self.timestep += 1
         return
 
+    def __log_topology(self, step):
+        """
+        Keep the topology of this step for record_topology and check it against
+        the verify_topology recording.
+        """
+        self.topology_log.append(step)
+        if self.topology_reference is not None:
+            actual = Schedule.from_steps([step])
+            expected = Schedule.from_steps([self.topology_reference.step(self.timestep)])
+            diff = compare_schedules(expected, actual)
+            if diff is not None:
+                raise ValueError(f"Topology differs from {self.verify_topology} at timestep {self.timestep}: "
+                                 + diff.replace("step 0: ", ""))
+        return
+
+    def write_topology(self, filename=None):
+        """
+        Save the topology recorded so far as a schedule.Schedule file.
+        """
+        filename = filename or self.record_topology
+        recording = Schedule.from_steps(self.topology_log, params=self.__schedule_params())
+        recording.save(filename)
+        print(f"Topology of {len(recording)} steps saved to {filename}")
+        return
+
+    def __schedule_params(self):
+        return schedule_params(self.size, self.max_refinement, self.uniform_refinement)
+
     def __perturb_mesh(self):
+        if self.executor is not None:
+            self.executor.perturb(self.perturbation, PERTURB)
+            return
+        if self.grid is not None:
+            self.grid.perturb(self.perturbation, PERTURB, self.timestep)
+            return
+
         for block in self.leaves:
             block.perturb(self.perturbation)
         return
 
-    def __do_refinement(self, block, shape) -> bool:
-        """
-        Depth-first refinement / coarsening.
-
-        Returns
-        -------
-        bool
-            True  – this block (or one of its descendants) intersects the
-                    shape’s border → keep it (and its parents) refined.
-            False – no intersection anywhere below → the whole subtree can be
-                    collapsed into this block.
-        """
-        # leaf block
-        if block.active:
-            intersects = shape.border_crosses(self.timestep, block)
-
-            # refine only if we need more resolution and*we are still below the refinement cap
-            if intersects and block.level < self.max_refinement:
-                block.refine()
-
-                # fall through: handle the children right away
-                x = False
-                for child in block.children:
-                    x = self.__do_refinement(child, shape) or x
-                return x
-            
-            # leaf stays as-is
-            return intersects
-
-        # internal node
-        # recurse on the existing children
-        child_hits = [self.__do_refinement(child, shape) for child in block.children]
-        any_hit   = any(child_hits)
-
-        all_leaf_children = all(child.active for child in block.children)
-        if not any_hit and all_leaf_children:
-            block.coarsen()
-            return False
-
-        return any_hit
-    
-    def __enforce_refinement(self):
-        for _ in range(self.max_refinement):
-
-            for leaf in self.leaves:
-                neighbors = self.__get_block_neighbors(leaf)
-                for n in neighbors:
-                    if n.level < leaf.level - 1:
-                        n.refine()
-        return
-    
-    def  __get_block_neighbors(self, block):
+    @annotate("do_refinement")
+    def __do_refinement(self, block, shape, ops=None) -> bool:
         """
-        Get the neighbors of a block in the mesh.
+        Refine / coarsen the tree under `block` around the shape (schedule.do_refinement).
         """
-        neighbors = []
-        for blk in self.leaves:
-            if blk != block and blk.active:
-                if (blk.xmin <= block.xmax and blk.xmax >= block.xmin and
-                    blk.ymin <= block.ymax and blk.ymax >= block.ymin):
-                    neighbors.append(blk)
-        return neighbors
+        return do_refinement(self, block, shape, ops)
+    
+    @annotate("enforce_refinement")
+    def __enforce_refinement(self, ops=None):
+        enforce_refinement(self, ops)
+        return
         
     # =========================================================
     # Shape Logic
@@ -226,68 +510,273 @@ class Simulation:
         ]
         return path
 
-    def __apply_shape(self, shape):
+    @annotate("apply_shape")
+    def __apply_shape(self, shape, ops=None, hits=None):
         """
         1. Recursively traverse the mesh and check if the shape intersects with the block.
         2. If the block is active and intersects with the shape, refine the block.
         3. If the block is not active, check if any of its children are active and intersect with the shape.
         4. If any of the children are active and intersect with the shape, refine the block.
         5. If the block is not active and none of its children are active, do nothing.
+
+        `shape` is anything with border_crosses/border_crosses_batch, normally the
+        ShapeIndex over all shapes of this timestep. When recording the topology,
+        refine/coarsen operations are appended to `ops` and the shape hits to `hits`.
         """
         
-        print("TS: " + str(self.timestep) + " Center at " + str(shape.center(self.timestep)))
+        centers = [str(s.center(self.timestep)) for s in self.shape_list]
+        print("TS: " + str(self.timestep) + " Center at " + ", ".join(centers))
 
         if not self.uniform_refinement:
             for row in self.mesh:
                 for block in row:
-                    _ = self.__do_refinement(block, shape)
+                    _ = self.__do_refinement(block, shape, ops)
+        step_hits = None
+        if hits is not None:
+            step_hits = self.__shape_hits(shape)
+            hits.extend(step_hits.tolist())
         if self.shape_affects_mesh:
-            self.__perturb_mesh_by_shape(shape)
+            self.__perturb_mesh_by_shape(shape, step_hits)
         return
     
-    def __perturb_mesh_by_shape(self, shape):
+    @annotate("replay_step")
+    def __replay_step(self):
+        """
+        The topology part of a step (__apply_shape and __enforce_refinement) from
+        the schedule: recorded operations and shape hits, no geometric tests.
+        """
+        shape_ops, hits, enforce_ops = self.schedule.step(self.timestep)
+        centers = [str(s.center(self.timestep)) for s in self.shape_list]
+        print("TS: " + str(self.timestep) + " Center at " + ", ".join(centers))
+
+        replay_ops(self, shape_ops)
+        if self.shape_affects_mesh:
+            # workers see the leaves in SFC order, not in the recorded one, and test the shape
+            self.__perturb_mesh_by_shape(ShapeIndex(self.shape_list, self.timestep), hits)
+        replay_ops(self, enforce_ops)
+        return shape_ops, hits, enforce_ops
+
+    def __perturb_mesh_by_shape(self, shape, hits=None):
         """
         Perturb only those leaf blocks whose border the shape crosses
-        at the current time‐step.
+        at the current time‐step. Known `hits` (see __shape_hits) skip the test.
         """
-        for block in self.leaves:
-            if shape.border_crosses(self.timestep, block):
-                block.perturb(1.0)
+        if self.executor is not None:
+            self.executor.perturb(1.0, SHAPE, shape)
+            return
+        if hits is None:
+            hits = self.__shape_hits(shape)
+        if self.grid is not None:
+            self.grid.perturb(1.0, SHAPE, self.timestep, hits)
+            return
+
+        leaves = self.leaves
+        for idx in hits.tolist():
+            leaves[idx].perturb(1.0, SHAPE)
         return
 
+    def __shape_hits(self, shape):
+        """
+        Indices of the leaves (cells of the dense grid) whose border the shape crosses.
+        """
+        if self.grid is not None:
+            return self.grid.border_cells(shape, self.timestep)
+        if not self.leaves:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(shape.border_crosses_batch(self.timestep, *leaf_bounds(self.leaves)))
+
     # =========================================================
     # Plotting Logic
     # =========================================================
 
+    @annotate("dump_simulation")
     def dump_simulation(self):
         """
-        Dump the simulation to a file.
+        Dump the simulation to a file (or to one file per rank, see ranks).
         """
+        if self.executor is not None:
+            self.executor.sync()
         
         filename = f"step_{self.timestep:04d}.dat"
+        if self.ranks is not None:
+            filename = f"checkpoint_ts{self.timestep:04d}.txt" # what combine_checkpoints produces
         
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
         filename = os.path.join(self.output_dir, filename)
-        print(f"Dumping simulation to {filename}")
 
-        for block in self.leaves:
-            block.binary_dump(filename)
+        # with the dense backend `leaves` are flat cell indices (None: storage order)
+        if self.grid is not None:
+            leaves = self.grid.dump_order(sfc=self.ranks is not None)
+            payload = self.grid.leaf_values(leaves, self.dtype)
+            counts = np.ones(len(payload), dtype=np.int64) # every cell is a root
+        elif self.ranks is None:
+            leaves = self.dump_order()
+            payload = self.leaf_values(leaves, self.dtype)
+        else:
+            leaves, counts = leaves_by_root(sfc_roots(self.mesh))
+            payload = self.leaf_values(leaves, self.dtype)
+
+        if self.ranks is None:
+            print(f"Dumping simulation to {filename}")
+            payload.tofile(filename)
+        else:
+            self.__dump_ranks(payload, leaf_ranges(counts, split_roots(counts, self.ranks)))
+
+        if self.compressor is not None:
+            self.compressor.submit(self.timestep, payload, os.path.basename(filename))
+        if self.delta_writer is not None:
+            self.delta_writer.write(self.timestep, self.__leaf_keys(leaves), payload)
+
+        meta = None
+        if self.export_metadata:
+            if self.grid is not None:
+                meta = self.grid.leaf_metadata(leaves, payload.itemsize)
+            else:
+                meta = self.leaf_metadata(leaves, payload.itemsize)
+            chunking.write_metadata(chunking.metadata_path(filename), meta)
+            print(f"Dirty leaves: {int(meta['dirty'].sum())}/{len(meta)}")
+
+        if self.chunking == "cdc":
+            boundaries = chunking.cdc_boundaries(payload, **{"align": max(chunking.DEFAULT_ALIGN, payload.itemsize),
+                                                             **self.chunk_params})
+            chunking.write_boundaries(chunking.boundaries_path(filename), boundaries)
+        elif self.chunking == "amr":
+            boundaries = chunking.amr_boundaries(meta, **self.chunk_params)
+            chunking.write_boundaries(chunking.boundaries_path(filename), boundaries)
+
+        if self.grid is not None:
+            self.grid.reset_dirty(leaves, 4 * payload.itemsize)
+        else:
+            self.__reset_dirty(leaves, 4 * payload.itemsize)
+        return
 
+    def __dump_ranks(self, payload, ranges):
+        """
+        Write the leaf range of every rank to its own dump_tsXXXX_peYYYYYY.txt, concurrently.
+        """
+        paths = [os.path.join(self.output_dir, f"dump_ts{self.timestep:04d}_pe{rank:06d}.txt")
+                 for rank in range(len(ranges))]
+        print(f"Dumping simulation to {len(paths)} rank files dump_ts{self.timestep:04d}_pe*.txt")
+
+        def write(path, start, end):
+            payload[start:end].tofile(path)
+
+        workers = self.dump_workers or min(32, len(paths))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(write, path, start, end) for path, (start, end) in zip(paths, ranges)]
+            for f in futures:
+                f.result()
         return
 
+    def __leaf_keys(self, leaves):
+        """
+        delta.block_keys of the dumped leaves (flat cell indices for the dense grid).
+        """
+        if self.grid is not None:
+            cells = slice(None) if leaves is None else leaves
+            return block_keys(self.grid.level[cells], self.grid.i[cells], self.grid.j[cells])
+        if not leaves:
+            return np.zeros(0, dtype=np.uint64)
+        level, i, j = zip(*(b.coords() for b in leaves))
+        return block_keys(level, i, j)
+
+    def __reset_dirty(self, leaves, nbytes):
+        """
+        Mark every dumped leaf clean and remember where it was written.
+        """
+        for idx, block in enumerate(leaves):
+            block.dirty = False
+            block.dump_offset = idx * nbytes
+        return
+
+    def dump_order(self):
+        """
+        Leaves in the order they are written to the checkpoint.
+        """
+        if self.ranks is not None:
+            return leaves_by_root(sfc_roots(self.mesh))[0]
+        if self.chunking == "amr":
+            return self.leaves_in_tree_order()
+        return self.leaves
+
+    def leaves_in_tree_order(self):
+        """
+        Depth-first traversal of every root (row-major), children in b0..b3 (Z) order.
+        All leaves of a subtree are contiguous in the result.
+        """
+        ordered = []
+        stack = []
+        for row in self.mesh:
+            for root in row:
+                stack.append(root)
+                while stack:
+                    block = stack.pop()
+                    if block.active:
+                        ordered.append(block)
+                    else:
+                        stack.extend(reversed(block.children))
+        return ordered
+
+    def leaf_values(self, leaves=None, dtype=np.float32):
+        """
+        Corner values of every leaf, shape (len(leaves), 4).
+        """
+        if leaves is None:
+            leaves = self.leaves
+        return np.asarray([(b.x1, b.x2, b.x3, b.x4) for b in leaves], dtype=dtype).reshape(-1, 4)
+
+    def leaf_metadata(self, leaves=None, itemsize=4):
+        """
+        Position of every leaf in the dump together with its place in the quadtree.
+        """
+        if leaves is None:
+            leaves = self.leaves
+        nbytes = 4 * itemsize
+        meta = np.zeros(len(leaves), dtype=chunking.LEAF_META_DTYPE)
+        meta["offset"] = np.arange(len(leaves), dtype=np.uint64) * nbytes
+        meta["nbytes"] = nbytes
+        if leaves:
+            meta["level"], meta["i"], meta["j"] = zip(*(b.coords() for b in leaves))
+            meta["dirty"] = [b.dirty for b in leaves]
+            meta["prev_offset"] = [b.dump_offset for b in leaves]
+        return meta
+
+    def __open_animation(self):
+        """
+        Create the sink that receives one rendered frame per plotted step.
+        """
+        if self.animation is None:
+            return None
+
+        image_dir = os.path.join(self.output_dir, "images")
+        os.makedirs(image_dir, exist_ok=True)
+        frames = self.sim_length + 1 # initial mesh + one per step
+
+        if self.animation == "gif":
+            duration = 1000 // frames
+            return GifStreamWriter(os.path.join(image_dir, "simulation.gif"), duration)
+        return FrameArchive(os.path.join(image_dir, "frames.npy"), frames)
+
+    @annotate("plot_mesh")
     def plot_mesh(self, show_internal=False):
         """
         Draw the current AMR layout, coloring each leaf by its mean value.
         """
         if not self.plot:
             return
+        if self.executor is not None:
+            self.executor.sync()
 
         # choose a colormap and a normalizer for values in [0,1]
-        cmap = cm.get_cmap("viridis")
+        cmap = plt.get_cmap("viridis")
         norm = colors.Normalize(vmin=0.0, vmax=1.0)
 
-        fig, ax = plt.subplots(figsize=(12, 12))
+        fig, ax = plt.subplots(figsize=(12, 12), dpi=self.animation_dpi)
+
+        # a dense grid is drawn as one image, cell (r, c) covering [c/Nu, (c+1)/Nu] x [r/Nu, (r+1)/Nu]
+        if self.grid is not None:
+            ax.imshow(self.grid.means(), cmap=cmap, norm=norm, extent=(0, 1, 1, 0), interpolation="nearest")
 
         # draw each leaf block
         for leaf in self.leaves:
@@ -329,23 +818,31 @@ class Simulation:
         cbar = fig.colorbar(sm, ax=ax, fraction=0.046, pad=0.04)
         cbar.set_label("mean(block value)")
 
+        # hand the rendered frame to the animation without touching the disk
+        if self.animation_sink is not None:
+            fig.canvas.draw()
+            self.animation_sink.append(np.asarray(fig.canvas.buffer_rgba())[:, :, :3])
+
         # save the figure
-        image_dir = os.path.join(self.output_dir, "images")
-        os.makedirs(image_dir, exist_ok=True)
-        filename = os.path.join(image_dir, f"mesh_{self.timestep:04d}.png")
-        plt.savefig(filename, dpi=300, bbox_inches="tight")
+        if self.save_png:
+            image_dir = os.path.join(self.output_dir, "images")
+            os.makedirs(image_dir, exist_ok=True)
+            filename = os.path.join(image_dir, f"mesh_{self.timestep:04d}.png")
+            plt.savefig(filename, dpi=300, bbox_inches="tight")
         plt.close(fig)
 
-    def plot_path(self, path):
+    def plot_path(self, *paths):
         if self.plot:
-            x_vals, y_vals = zip(*path)
-
-            print(f"Path: {path}")
-
             plt.figure(figsize=(6, 6))
             ax = plt.gca()                       # grab the current Axes
-            ax.plot(x_vals, y_vals,
-                    marker='o', linestyle='-', color='blue')
+
+            for k, path in enumerate(paths):
+                x_vals, y_vals = zip(*path)
+
+                print(f"Path: {path}")
+
+                ax.plot(x_vals, y_vals,
+                        marker='o', linestyle='-', color='blue' if k == 0 else None)
 
             # domain and orientation
             ax.set_xlim(0.0, 1.0)               # X: 0 → 1 (left → right)
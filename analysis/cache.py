@@ -0,0 +1,59 @@
+import os
+import hashlib
+import numpy as np
+
+# =========================================================
+# Parsed-file cache
+#
+# Parsed columns of an input file are kept as an .npz in CACHE_DIR:
+# one array per column, plus the mtime and size of the source file. An entry is
+# only used while the source file is unchanged. Writes go through a temporary
+# file and os.replace, so concurrent workers never see a partial entry.
+# =========================================================
+
+CACHE_DIR = os.environ.get(
+    "ANALYSIS_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "dynamic_chunking", "analysis"),
+)
+
+def cache_file(path, tag):
+    key = hashlib.sha1(f"{os.path.abspath(path)}|{tag}".encode()).hexdigest()
+    return os.path.join(CACHE_DIR, tag, key + ".npz")
+
+def load_cached(path, tag, st=None):
+    """
+    Cached columns of `path` as a dict of arrays, or None if missing or stale.
+    """
+    if st is None:
+        st = os.stat(path)
+    cache = cache_file(path, tag)
+    try:
+        with np.load(cache) as c:
+            if int(c["_mtime_ns"]) != st.st_mtime_ns or int(c["_size"]) != st.st_size:
+                return None
+            return {k: c[k] for k in c.files if not k.startswith("_")}
+    except (OSError, KeyError, ValueError):
+        return None
+
+def save_cached(path, tag, columns, st=None):
+    if st is None:
+        st = os.stat(path)
+    cache = cache_file(path, tag)
+    os.makedirs(os.path.dirname(cache), exist_ok=True)
+    tmp = cache + f".{os.getpid()}.tmp.npz"
+    np.savez(tmp, _mtime_ns=st.st_mtime_ns, _size=st.st_size, **columns)
+    os.replace(tmp, cache)
+    return
+
+def cached(path, tag, parse, use_cache=True):
+    """
+    parse(path) -> dict of arrays, memoized on disk by (path, tag, mtime, size).
+    """
+    if not use_cache:
+        return parse(path)
+    st = os.stat(path)
+    columns = load_cached(path, tag, st)
+    if columns is None:
+        columns = parse(path)
+        save_cached(path, tag, columns, st)
+    return columns
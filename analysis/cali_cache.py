@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from cache import CACHE_DIR, cached
+
+# =========================================================
+# Caliper profile cache
+#
+# Reading a .cali (or a hatchet literal .json) with Thicket is slow and the
+# analysis scripts only keep a few columns of the result. load_cali reads a
+# profile once, keeps the node names, their depth and path in the call tree, and
+# every numeric metric, and stores them as columns in an .npz named after the
+# hash of the file contents. The content hash itself is memoized per
+# (path, mtime, size), so an unchanged profile is not even re-hashed.
+# =========================================================
+
+CALI_CACHE_DIR = os.path.join(CACHE_DIR, "cali")
+
+# Time columns in order of preference, as named by the different Caliper configs
+TIME_METRICS = ["Avg time/rank", "sum#time.duration", "time", "total_time"]
+
+def file_digest(path):
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return {"digest": np.array(h.hexdigest())}
+
+def cali_digest(path, use_cache=True):
+    return str(cached(path, "cali_digest", file_digest, use_cache)["digest"])
+
+def read_cali(path):
+    """
+    Read a .cali with Thicket and flatten it to a DataFrame with columns
+    name, depth, path and one column per numeric metric, in call-tree order.
+    A .json path is read as a hatchet literal tree instead, e.g. the
+    profile.json written by the 2D simulation (2d-sim/profiling.py).
+    """
+    import thicket as tt
+
+    if path.endswith(".json"):
+        with open(path, "r") as f:
+            th = tt.Thicket.from_literal(json.load(f))
+    else:
+        th = tt.Thicket.from_caliperreader(path)
+    df = th.dataframe
+    order = {node: k for k, node in enumerate(th.graph.traverse())}
+    nodes = df.index.get_level_values("node")
+
+    out = pd.DataFrame({
+        "name":  df["name"].astype(str).to_numpy(),
+        "depth": np.array([node._depth for node in nodes], dtype=np.int32),
+        "path":  ["/".join(str(n.frame.get("name")) for n in node.path()) for node in nodes],
+    })
+    for col in df.columns:
+        if col != "name" and pd.api.types.is_numeric_dtype(df[col]):
+            out[col] = df[col].to_numpy(dtype=np.float64)
+
+    rank = np.array([order.get(node, len(order)) for node in nodes])
+    return out.iloc[np.argsort(rank, kind="stable")].reset_index(drop=True)
+
+def _cache_path(digest):
+    return os.path.join(CALI_CACHE_DIR, digest + ".npz")
+
+def _save(df, cache):
+    os.makedirs(os.path.dirname(cache), exist_ok=True)
+    # metric names contain "/" and "#", so columns are stored by position;
+    # text columns become fixed-width unicode so no pickling is involved
+    columns = {}
+    for k, col in enumerate(df.columns):
+        values = df[col].to_numpy()
+        columns[f"c{k}"] = values.astype(str) if values.dtype == object else values
+    tmp = cache + f".{os.getpid()}.tmp.npz"
+    np.savez(tmp, columns=np.array(df.columns, dtype=str), **columns)
+    os.replace(tmp, cache)
+    return
+
+def _load(cache):
+    with np.load(cache) as c:
+        names = [str(n) for n in c["columns"]]
+        return pd.DataFrame({name: c[f"c{k}"] for k, name in enumerate(names)})
+
+def load_cali(path, use_cache=True):
+    """
+    Flattened profile of one .cali (see read_cali), read from the cache when
+    a profile with the same contents was read before.
+    """
+    if not use_cache:
+        return read_cali(path)
+    cache = _cache_path(cali_digest(path))
+    if os.path.exists(cache):
+        return _load(cache)
+    df = read_cali(path)
+    _save(df, cache)
+    return df
+
+def load_cali_files(paths, workers=None, use_cache=True):
+    """
+    load_cali for several profiles, in a process pool, concatenated with a
+    "file" column telling the rows apart.
+    """
+    paths = list(paths)
+    if not paths:
+        return pd.DataFrame({"file": [], "name": [], "depth": [], "path": []})
+    if workers is None:
+        workers = min(len(paths), os.cpu_count() or 1)
+
+    if workers <= 1 or len(paths) == 1:
+        frames = [load_cali(p, use_cache) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(load_cali, paths, [use_cache] * len(paths)))
+
+    for path, df in zip(paths, frames):
+        df.insert(0, "file", path)
+    return pd.concat(frames, ignore_index=True)
+
+def time_column(df, candidates=TIME_METRICS):
+    """
+    First of `candidates` present in `df`.
+    """
+    for col in candidates:
+        if col in df.columns:
+            return col
+    raise ValueError("No appropriate time column found in dataframe.")
+
+def format_tree(df, metric=None):
+    """
+    Indented text rendering of a flattened profile, one node per line.
+    """
+    if metric is None:
+        metric = time_column(df)
+    lines = []
+    for depth, name, value in zip(df["depth"], df["name"], df[metric]):
+        lines.append(f"{value:12.6f} {'  ' * int(depth)}{name}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    # Warm the cache, e.g. right after a batch of runs finished
+    if len(sys.argv) < 2:
+        print("Usage: python cali_cache.py <file.cali> [<file.cali> ...]")
+        sys.exit(1)
+
+    df = load_cali_files(sys.argv[1:])
+    print(f"Cached {len(sys.argv) - 1} profiles ({len(df)} nodes) in {CALI_CACHE_DIR}")
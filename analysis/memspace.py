@@ -0,0 +1,124 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from cache import cached
+
+# =========================================================
+# Kokkos memspace_usage ingestion
+#
+# A memspace_usage file is a whitespace table with "#" comments:
+#   # Time(s)  Size(MB)  HighWater(MB)  HighWater-Process(MB)
+# Files are parsed with a single numeric pass (no pandas), cached per file as
+# columns (see cache.py), and read in a process pool when there are many.
+# =========================================================
+
+USAGE_COLUMNS = ["Time(s)", "Size(MB)", "HighWater(MB)", "HighWater-Process(MB)"]
+HW_COLUMN     = "HighWater-Process(MB)"
+HOST_SUFFIX   = "-Host.memspace_usage"
+CACHE_TAG     = "memspace_usage"
+
+# Root of the checkpoint_restore_analysis tree holding data/, csv/ and graphs/
+ANALYSIS_ROOT = os.environ.get(
+    "CHECKPOINT_ANALYSIS_ROOT",
+    "/home/zmalk/Research/ANL/checkpoint_restore/checkpoint_restore_analysis",
+)
+HPDC25_DATA   = os.path.join(ANALYSIS_ROOT, "data", "HPDC25")
+MEM_RESULTS   = os.path.join(HPDC25_DATA, "mem_results")
+CSV_DIR       = os.path.join(ANALYSIS_ROOT, "csv")
+GRAPHS_DIR    = os.path.join(ANALYSIS_ROOT, "graphs")
+
+def parse_memspace_usage(path):
+    """
+    Parse one memspace_usage file into a dict of float64 columns.
+    """
+    with open(path, "r") as f:
+        text = f.read()
+    if "#" in text:
+        text = "\n".join(line.split("#", 1)[0] for line in text.splitlines())
+    values = np.fromstring(text, dtype=np.float64, sep=" ")
+    ncols = len(USAGE_COLUMNS)
+    if len(values) % ncols:
+        raise ValueError(f"{path}: {len(values)} values do not form rows of {ncols} columns.")
+    table = values.reshape(-1, ncols)
+    return {name: np.ascontiguousarray(table[:, k]) for k, name in enumerate(USAGE_COLUMNS)}
+
+def load_memspace_usage(path, use_cache=True):
+    """
+    Columns of one memspace_usage file, served from the cache when it is fresh.
+    """
+    return cached(path, CACHE_TAG, parse_memspace_usage, use_cache)
+
+def find_usage_files(case_path, suffix=HOST_SUFFIX):
+    """
+    Sorted memspace_usage files in `case_path`.
+    """
+    return sorted(
+        os.path.join(case_path, f)
+        for f in os.listdir(case_path)
+        if f.endswith(suffix)
+    )
+
+# =========================================================
+# Parallel reductions
+# =========================================================
+
+def _columns(path, columns, use_cache):
+    usage = load_memspace_usage(path, use_cache)
+    return [usage[c] for c in columns]
+
+def _column_max(path, column, use_cache):
+    values = load_memspace_usage(path, use_cache)[column]
+    return values.max() if len(values) else np.nan
+
+def map_files(fn, paths, *args, workers=None):
+    """
+    [fn(path, *args) for path in paths], in a process pool when worth it.
+    workers=1 runs in the current process.
+    """
+    paths = list(paths)
+    if workers is None:
+        workers = min(len(paths), os.cpu_count() or 1)
+    if workers <= 1 or len(paths) <= 1:
+        return [fn(p, *args) for p in paths]
+
+    chunksize = max(1, len(paths) // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, paths, *([a] * len(paths) for a in args), chunksize=chunksize))
+
+def max_highwater(paths, column=HW_COLUMN, workers=None, use_cache=True):
+    """
+    Maximum of `column` in each file, as an array in the order of `paths`.
+    """
+    return np.array(map_files(_column_max, paths, column, use_cache, workers=workers), dtype=np.float64)
+
+def highwater_stats(paths, column=HW_COLUMN, workers=None, use_cache=True):
+    """
+    Mean and std over files of the per-file maximum of `column`.
+    """
+    values = max_highwater(paths, column, workers, use_cache)
+    if len(values) == 0:
+        return np.nan, np.nan
+    return np.mean(values), np.std(values)
+
+def rowwise_mean(paths, x_col="Time(s)", y_col=HW_COLUMN, workers=None, use_cache=True):
+    """
+    Row-wise average of `x_col` and `y_col` across repeats of the same case.
+
+    Returns a DataFrame with columns [x_col, "avg_HW"]. Files of different
+    lengths are padded with NaN, so each row averages the repeats that have it.
+    """
+    if not paths:
+        return pd.DataFrame({x_col: [], "avg_HW": []})
+    pairs = map_files(_columns, paths, (x_col, y_col), use_cache, workers=workers)
+    xs = [x for x, _ in pairs]
+    ys = [y for _, y in pairs]
+
+    def padded_mean(columns):
+        rows = max((len(c) for c in columns), default=0)
+        table = np.full((len(columns), rows), np.nan)
+        for k, c in enumerate(columns):
+            table[k, :len(c)] = c
+        return np.nanmean(table, axis=0)
+
+    return pd.DataFrame({x_col: padded_mean(xs), "avg_HW": padded_mean(ys)})
@@ -1,8 +1,12 @@
-import thicket as tt
+import os
+import sys
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from cali_cache import load_cali_files
+
 # =================== Test Cases ===================
 
 # The size of the data is 1GB
@@ -43,12 +47,9 @@ shifted_fixed_mix_changes = '../data/cases/shifted_fixed_mix/changes.csv'
 def read_cali_files(file_list):
     """
     Reads and combines multiple Caliper (.cali) files into a single DataFrame.
+    Profiles are read concurrently and served from the cache once read.
     """
-    combined_df = pd.DataFrame()
-    for filename in file_list:
-        th = tt.Thicket.from_caliperreader(filename)
-        df = th.dataframe
-        combined_df = pd.concat([combined_df, df], ignore_index=True)
+    combined_df = load_cali_files(file_list)
     filtered_df = filter_and_clean_df(combined_df)
     return filtered_df
 
@@ -1,51 +1,19 @@
 import os
-import pandas as pd
+import sys
+import argparse
 import matplotlib.pyplot as plt
 
-def read_and_average(file_list, x_col="Time(s)"):
-    """
-    Given a list of memspace_usage files for a single case,
-    read each file, extract the specified x-axis column (default "Time(s)")
-    and the "HighWater-Process(MB)" column, then compute the row-wise average
-    of both columns.
-    
-    Returns a DataFrame with columns [x_col, "avg_HW"].
-    Assumes all files for a given case have the same number of rows.
-    """
-    usage_columns = ["Time(s)", "Size(MB)", "HighWater(MB)", "HighWater-Process(MB)"]
-    
-    time_list = []
-    hw_list = []
-    
-    # Read each file into a separate DataFrame and store the columns of interest
-    for idx, fpath in enumerate(file_list):
-        df = pd.read_csv(
-            fpath,
-            comment="#",            # Skip comment lines starting with '#'
-            header=None,
-            delim_whitespace=True,  # Data is whitespace-delimited
-            names=usage_columns
-        )
-        
-        time_list.append(df[x_col].rename(f"time_{idx}"))
-        hw_list.append(df["HighWater-Process(MB)"].rename(f"iter_{idx}"))
-    
-    # Average the x-axis values and the HighWater-Process(MB) values row-wise
-    merged_time = pd.concat(time_list, axis=1)
-    merged_hw = pd.concat(hw_list, axis=1)
-    
-    avg_time = merged_time.mean(axis=1)
-    avg_hw = merged_hw.mean(axis=1)
-    
-    # Construct the final DataFrame using the averaged values
-    result_df = pd.DataFrame({
-        x_col: avg_time,
-        "avg_HW": avg_hw
-    })
-    return result_df
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from memspace import find_usage_files, rowwise_mean, MEM_RESULTS, GRAPHS_DIR
 
 def main():
-    root_dir = "/home/zmalk/Research/ANL/checkpoint_restore/checkpoint_restore_analysis/data/HPDC25/mem_results"
+    parser = argparse.ArgumentParser(description="Average memory high-water lines for the HPDC25 runs.")
+    parser.add_argument("--mem-results", default=MEM_RESULTS, help="Directory holding <chunk_size>/<method>/<case>/.")
+    parser.add_argument("--output-dir", default=os.path.join(GRAPHS_DIR, "HPDC25"), help="Where the graphs are saved.")
+    parser.add_argument("--workers", type=int, default=None, help="Processes used to parse memspace_usage files.")
+    args = parser.parse_args()
+
+    root_dir = args.mem_results
     # Reorder methods so that the optimized version appears on the right.
     methods = ["full", "basic", "list", "tree_naive", "tree_posix", "tree_liburing_optimized"]
     cases = ["0_100_0", "25_25_50", "80_10_10", "100_0_0"]
@@ -70,16 +38,11 @@ def main():
             # Build the path to the case directory
             case_path = os.path.join(root_dir, chunk_size, method, case)
 
-            # Gather all files ending with '-Host.memspace_usage'
-            file_list = [
-                os.path.join(case_path, f)
-                for f in os.listdir(case_path)
-                if f.endswith("-Host.memspace_usage")
-            ]
-            file_list.sort()  # Sort for consistent ordering
+            # Gather all files ending with '-Host.memspace_usage', sorted for consistent ordering
+            file_list = find_usage_files(case_path)
 
             # Read data & compute the average for both time and HW columns
-            avg_df = read_and_average(file_list, x_col=x_axis_col)
+            avg_df = rowwise_mean(file_list, x_col=x_axis_col, workers=args.workers)
 
             # Format the case string from "x_y_z" to "(x, y, z)"
             formatted_case = "(" + ", ".join(case.split("_")) + ")"
@@ -108,10 +71,7 @@ def main():
         # Adjust layout to prevent clipping
         plt.tight_layout()
         # Save the figure using the method name in the file name
-        save_path = os.path.join(
-            "/home/zmalk/Research/ANL/checkpoint_restore/checkpoint_restore_analysis/graphs/HPDC25",
-            f"hpdc25_mem_2048_{method}.png"
-        )
+        save_path = os.path.join(args.output_dir, f"hpdc25_mem_{chunk_size}_{method}.png")
         plt.savefig(save_path)
         plt.show()
 
@@ -1,40 +1,30 @@
 import os
+import sys
+import argparse
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 import seaborn as sns
 from matplotlib.lines import Line2D  # Needed for the full method legend handle
 import matplotlib.ticker as mticker
 
-def compute_mem_hw_stats(file_list):
-    """
-    For a list of memspace_usage files, compute the maximum
-    "HighWater-Process(MB)" from each file and return the mean and std.
-    """
-    values = []
-    for fpath in file_list:
-        df = pd.read_csv(
-            fpath,
-            comment="#",
-            header=None,
-            delim_whitespace=True,
-            names=["Time(s)", "Size(MB)", "HighWater(MB)", "HighWater-Process(MB)"]
-        )
-        max_val = df["HighWater-Process(MB)"].max()
-        values.append(max_val)
-    if values:
-        return np.mean(values), np.std(values)
-    else:
-        return np.nan, np.nan
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from memspace import find_usage_files, max_highwater, MEM_RESULTS, GRAPHS_DIR
 
 def main():
+    parser = argparse.ArgumentParser(description="Bar chart of memory high-water usage for the HPDC25 runs.")
+    parser.add_argument("--mem-results", default=MEM_RESULTS, help="Directory holding <chunk_size>/<method>/<case>/.")
+    parser.add_argument("--output", default=os.path.join(GRAPHS_DIR, "HPDC25", "hpdc25_mem_bar.png"),
+                        help="Path of the saved figure.")
+    parser.add_argument("--workers", type=int, default=None, help="Processes used to parse memspace_usage files.")
+    args = parser.parse_args()
+
     # sns.set_style("whitegrid")
     sns.set_context("paper")
 
 
     # Base directory where memory usage results are stored
-    root_dir = "/home/zmalk/Research/ANL/checkpoint_restore/checkpoint_restore_analysis/data/HPDC25/mem_results"
+    root_dir = args.mem_results
     chunk_size = "2048"
 
     # Define all available methods (folder names in the data directory).
@@ -62,18 +52,19 @@ def main():
     }
 
     # Compute memory highwater stats for each test case and method.
+    # All files are parsed in one parallel pass, then split per (case, method).
+    groups = [
+        (case, method, find_usage_files(os.path.join(root_dir, chunk_size, method, case)))
+        for case in cases for method in all_methods
+    ]
+    maxima = max_highwater([f for _, _, files in groups for f in files], workers=args.workers)
+
     data = {case: {} for case in cases}
-    for case in cases:
-        for method in all_methods:
-            case_path = os.path.join(root_dir, chunk_size, method, case)
-            file_list = [
-                os.path.join(case_path, f)
-                for f in os.listdir(case_path)
-                if f.endswith("-Host.memspace_usage")
-            ]
-            file_list.sort()
-            mean_val, std_val = compute_mem_hw_stats(file_list)
-            data[case][method] = (mean_val, std_val)
+    start = 0
+    for case, method, files in groups:
+        values = maxima[start:start + len(files)]
+        start += len(files)
+        data[case][method] = (np.mean(values), np.std(values)) if len(values) else (np.nan, np.nan)
 
     # Assign colors and hatch patterns to match runtime graph styling.
     # Use only the bar_methods (exclude "full" since it's drawn as a line)
@@ -147,7 +138,7 @@ def main():
     plt.tight_layout(rect=[0.1, 0, 1, 0.95])
 
     # Save and display the figure.
-    save_path = "/home/zmalk/Research/ANL/checkpoint_restore/checkpoint_restore_analysis/graphs/HPDC25/hpdc25_mem_bar.png"
+    save_path = args.output
     plt.savefig(save_path, bbox_inches="tight")
     plt.show()
 
@@ -1,22 +1,19 @@
-import thicket as tt
+import os
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from cali_cache import load_cali, time_column
+
 # ================ Single File Processing ================
 
 def process_single_cali(file_path):
     """Process a single cali file and filter for relevant profiling regions."""
-    th = tt.Thicket.from_caliperreader(file_path)
-    df = th.dataframe
+    df = load_cali(file_path)
 
     # Identify the correct time column
-    time_columns = ['Avg time/rank', 'sum#time.duration', 'time', 'total_time']
-    for col in time_columns:
-        if col in df.columns:
-            time_col = col
-            break
-    else:
-        raise ValueError("No appropriate time column found in dataframe.")
+    time_col = time_column(df)
 
     # Keep relevant columns and clean data
     df = df[['name', time_col]].rename(columns={time_col: 'Avg Time'})
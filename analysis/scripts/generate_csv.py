@@ -1,65 +1,48 @@
 import os
+import sys
+import argparse
 import numpy as np
 import pandas as pd
 import seaborn as sns
 
-def compute_mem_hw_stats(file_list):
-    """
-    For a list of memspace_usage files, compute the maximum
-    "HighWater-Process(MB)" from each file and return the mean and std.
-    """
-    values = []
-    for fpath in file_list:
-        df = pd.read_csv(
-            fpath,
-            comment="#",
-            header=None,
-            delim_whitespace=True,
-            names=["Time(s)", "Size(MB)", "HighWater(MB)", "HighWater-Process(MB)"]
-        )
-        max_val = df["HighWater-Process(MB)"].max()
-        values.append(max_val)
-    if values:
-        return np.mean(values), np.std(values)
-    else:
-        return np.nan, np.nan
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from memspace import find_usage_files, max_highwater, MEM_RESULTS, HPDC25_DATA, CSV_DIR
 
-def process_mem_results():
+def process_mem_results(root_dir=MEM_RESULTS, output_dir=CSV_DIR, chunk_size="2048", workers=None):
     """
     Process memory high-water usage files and generate a CSV file
     with mean and std values for each test case and method.
     """
-    # Base directory where memory usage results are stored
-    root_dir = "/home/zmalk/Research/ANL/checkpoint_restore/checkpoint_restore_analysis/data/HPDC25/mem_results"
-    chunk_size = "2048"
-
     # Define available methods and test cases.
     all_methods = ["basic", "full", "list", "tree_naive", "tree_posix", "tree_liburing_optimized"]
     cases = ["0_100_0", "25_25_50", "80_10_10", "100_0_0"]
 
-    rows = []
+    groups = []
     for case in cases:
         for method in all_methods:
             case_path = os.path.join(root_dir, chunk_size, method, case)
             if not os.path.exists(case_path):
                 print(f"Directory does not exist: {case_path}. Skipping.")
                 continue
-            file_list = [
-                os.path.join(case_path, f)
-                for f in os.listdir(case_path)
-                if f.endswith("-Host.memspace_usage")
-            ]
-            file_list.sort()
-            mean_val, std_val = compute_mem_hw_stats(file_list)
-            rows.append({
-                "test_case": case,
-                "method": method,
-                "mean": mean_val,
-                "std": std_val
-            })
+            groups.append((case, method, find_usage_files(case_path)))
+
+    # One pass over every file of every case, so the pool is started only once
+    all_files = [f for _, _, files in groups for f in files]
+    maxima = max_highwater(all_files, workers=workers)
+
+    rows = []
+    start = 0
+    for case, method, files in groups:
+        values = maxima[start:start + len(files)]
+        start += len(files)
+        rows.append({
+            "test_case": case,
+            "method": method,
+            "mean": np.mean(values) if len(values) else np.nan,
+            "std": np.std(values) if len(values) else np.nan
+        })
 
     df_mem = pd.DataFrame(rows)
-    output_dir = "/home/zmalk/Research/ANL/checkpoint_restore/checkpoint_restore_analysis/csv"
     os.makedirs(output_dir, exist_ok=True)
     output_csv = os.path.join(output_dir, "hpdc25_mem_stats.csv")
     df_mem.to_csv(output_csv, index=False)
@@ -74,13 +57,12 @@ def get_full_avg(file):
     avg_runtime = full_df[4].mean()
     return avg_runtime
 
-def process_restore_results():
+def process_restore_results(results_path=HPDC25_DATA, output_dir=CSV_DIR):
     """
     Process checkpoint restore runtime results and generate CSV files for:
       - Aggregated runtime stats (mean and std) by chunk_size, dedup_case, and method.
       - The overall full restore average.
     """
-    results_path = "/home/zmalk/Research/ANL/checkpoint_restore/checkpoint_restore_analysis/data/HPDC25/"
     combined_file = os.path.join(results_path, "combined_results.csv")
     full_restore_file = os.path.join(results_path, "full_restore.csv")
     
@@ -88,7 +70,6 @@ def process_restore_results():
     full_avg = get_full_avg(full_restore_file)
     full_avg_df = pd.DataFrame([{"full_avg": full_avg}])
     
-    output_dir = "/home/zmalk/Research/ANL/checkpoint_restore/checkpoint_restore_analysis/csv"
     os.makedirs(output_dir, exist_ok=True)
     output_full_avg_csv = os.path.join(output_dir, "hpdc25_full_avg.csv")
     full_avg_df.to_csv(output_full_avg_csv, index=False)
@@ -109,10 +90,17 @@ def process_restore_results():
     print(f"Checkpoint restore stats CSV saved to {output_restore_csv}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Generate the HPDC25 memory and restore stats CSVs.")
+    parser.add_argument("--data-dir", default=HPDC25_DATA, help="HPDC25 results directory (holds mem_results/).")
+    parser.add_argument("--output-dir", default=CSV_DIR, help="Where the CSV files are written.")
+    parser.add_argument("--chunk-size", default="2048", help="Chunk size subdirectory of mem_results.")
+    parser.add_argument("--workers", type=int, default=None, help="Processes used to parse memspace_usage files.")
+    args = parser.parse_args()
+
     # Process and output CSV files for memory usage statistics.
-    process_mem_results()
+    process_mem_results(os.path.join(args.data_dir, "mem_results"), args.output_dir, args.chunk_size, args.workers)
     # Process and output CSV files for checkpoint restore statistics.
-    process_restore_results()
+    process_restore_results(args.data_dir, args.output_dir)
 
 if __name__ == "__main__":
     main()
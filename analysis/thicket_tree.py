@@ -1,10 +1,15 @@
-import thicket as tt
+import os
+import sys
 from sys import argv
 
-if len(argv) != 2:
-    print("Usage: python thicket.py <caliper_file>")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from cali_cache import load_cali, format_tree, time_column
+
+if len(argv) not in (2, 3):
+    print("Usage: python thicket.py <caliper_file|profile.json> [metric_column]")
     exit(1)
 
 filepath = argv[1]
-th = tt.Thicket.from_caliperreader(filepath)
-print(th.tree(metric_column="Avg time/rank"))
+df = load_cali(filepath)
+metric = argv[2] if len(argv) == 3 else time_column(df)
+print(format_tree(df, metric))
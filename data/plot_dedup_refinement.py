@@ -1,6 +1,10 @@
 import os
+import sys
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from storage_usage import load_usage
+
 # Base directory (where r2, r3, r4, r5... are located)
 base_dir = '.'
 
@@ -10,33 +14,19 @@ r_dirs = sorted([d for d in os.listdir(base_dir) if os.path.isdir(os.path.join(b
 plt.figure(figsize=(10, 6))
 
 for r_dir in r_dirs:
-    usage_path = os.path.join(base_dir, r_dir, 'dedup', 'usage.txt')
+    usage_dir = os.path.join(base_dir, r_dir, 'dedup')
 
-    if not os.path.exists(usage_path):
-        print(f"Skipping {r_dir} (no dedup/usage.txt found)")
+    try:
+        usage = load_usage(usage_dir)
+    except FileNotFoundError:
+        print(f"Skipping {r_dir} (no dedup/usage.npz or usage.txt found)")
         continue
 
-    timesteps = []
-    sizes = []
-
-    with open(usage_path, 'r') as f:
-        lines = f.readlines()
-
-    for line in lines:
-        parts = line.strip().split()
-        if len(parts) < 9:
-            continue  # Skip lines like "total 44332"
-        size = int(parts[4])  # size in bytes
-        filename = parts[8]
-
-        if filename.startswith("dump_ts") and "_pe" in filename:
-            timestep_part = filename.split("_pe")[0]  # e.g., "dump_ts0000"
-            timestep = int(timestep_part.replace("dump_ts", ""))
-            timesteps.append(timestep)
-            sizes.append(size)
+    timesteps = usage['ts'].tolist()
+    sizes = usage['ts_size'].tolist()
 
     if not timesteps:
-        print(f"No data found in {usage_path}")
+        print(f"No data found in {usage_dir}")
         continue
 
     # Sort by timestep
@@ -1,11 +1,15 @@
 import os
+import sys
 import matplotlib.pyplot as plt
 
-# Define the methods and their usage.txt paths
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'scripts'))
+from storage_usage import load_usage
+
+# Define the methods and their usage directories (usage.npz, or a legacy usage.txt)
 methods = {
-    'dedup': 'dedup/usage.txt',
-    'baseline': 'baseline/usage.txt',
-    'amr': 'amr/usage.txt'
+    'dedup': 'dedup',
+    'baseline': 'baseline',
+    'amr': 'amr'
 }
 
 # Define placeholder names
@@ -21,32 +25,14 @@ plot_order = ['baseline', 'dedup', 'amr']
 
 usage_data = {}
 
-# Parse each usage.txt
+# Load each method's usage (per-timestep totals are precomputed)
 for method, path in methods.items():
-    timesteps = []
-    sizes = []
-    total_usage = 0
-
-    with open(path, 'r') as f:
-        lines = f.readlines()
-
-    for line in lines:
-        parts = line.strip().split()
-        if len(parts) < 9:
-            continue  # Skip lines like "total 94644"
-        size = int(parts[4])
-        filename = parts[8]
-
-        if filename.startswith("dump_ts") and "_pe" in filename:
-            timestep_part = filename.split("_pe")[0]  # "dump_ts0000"
-            timestep = int(timestep_part.replace("dump_ts", ""))
-            timesteps.append(timestep)
-            sizes.append(size)
-            total_usage += size
+    usage = load_usage(path)
+    total_usage = int(usage['cum_size'][-1]) if len(usage['ts']) else 0
 
     usage_data[method] = {
-        'timesteps': timesteps,
-        'sizes': sizes,
+        'timesteps': usage['ts'].tolist(),
+        'sizes': usage['ts_size'].tolist(),
         'total': total_usage
     }
 
@@ -2,17 +2,27 @@ import os
 import sys
 import glob
 import re
+import errno
 import shutil
+import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import argparse
+from virtual_checkpoint import write_manifest, read_manifest, MANIFEST_EXT
 
-def combine_timestep_files(input_dir, output_dir):
+def combine_timestep_files(input_dir, output_dir, workers=None, verify=True, virtual=False):
     """
     combines miniAMR dump files (dump_ts*_pe*.txt) into single checkpoint files per timestep.
 
     Args:
         input_dir (str): Directory containing the dump_*.txt files.
         output_dir (str): Directory where combined checkpoint_*.txt files will be saved.
+        workers (int): Number of timesteps combined concurrently.
+        verify (bool): Check every output size against the sum of its inputs
+                       (with virtual, that every referenced input exists and the
+                       manifest lengths add up to it).
+        virtual (bool): Write checkpoint_*.manifest files listing (file, offset, length)
+                        instead of copying any data; read them with VirtualCheckpoint.
     """
     if not os.path.isdir(input_dir):
         print(f"Error: Input directory '{input_dir}' not found.")
@@ -44,50 +54,177 @@ def combine_timestep_files(input_dir, output_dir):
         else:
             print(f"Warning: Skipping file with unexpected name format: {filepath}")
 
-    # Process each timestep
-    timesteps_processed = 0
-    for timestep, files in sorted(timestep_files.items()):
-        # Sort files by PE rank to ensure correct concatenation order
-        files.sort(key=lambda x: x['rank'])
-
-        output_filename = f"checkpoint_ts{timestep:04d}.txt"
-        output_filepath = os.path.join(output_dir, output_filename)
+    # Process timesteps concurrently; kernel-side copies release the GIL
+    if workers is None:
+        workers = min(32, (os.cpu_count() or 1) + 4)
 
-        print(f"Comtxting {len(files)} files for timestep {timestep} into {output_filepath}...")
+    combine = manifest_one_timestep if virtual else combine_one_timestep
 
+    timesteps_processed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(combine, timestep, files, output_dir, verify): timestep
+            for timestep, files in sorted(timestep_files.items())
+        }
         try:
-            with open(output_filepath, 'wb') as outfile:
-                for file_info in files:
-                    try:
-                        with open(file_info['path'], 'rb') as infile:
-                            shutil.copyfileobj(infile, outfile)
-                    except IOError as e:
-                        print(f"Error reading input file {file_info['path']}: {e}")
-                        # Optionally remove partially created output file
-                        outfile.close()
-                        os.remove(output_filepath)
-                        sys.exit(1) # Or continue to next timestep?
-
-            timesteps_processed += 1
-            # Optional: Verify size (sum of input sizes should match output size)
-            # total_input_size = sum(os.path.getsize(f['path']) for f in files)
-            # output_size = os.path.getsize(output_filepath)
-            # if total_input_size != output_size:
-            #     print(f"Warning: Size mismatch for timestep {timestep}. Expected {total_input_size}, got {output_size}.")
-
+            for future in as_completed(futures):
+                future.result()
+                timesteps_processed += 1
         except IOError as e:
-            print(f"Error writing output file {output_filepath}: {e}")
+            print(f"Error combining timestep {futures[future]}: {e}")
+            for f in futures:
+                f.cancel()
             sys.exit(1)
 
     print(f"\nSuccessfully combined files for {timesteps_processed} timesteps.")
     print(f"combined checkpoints saved in: '{output_dir}'")
 
 
+# =========================================================
+# Copy engine
+# =========================================================
+
+# Copy primitives in order of preference. A primitive that is not supported for
+# a pair of files (cross-device, missing syscall, ...) is dropped for the rest
+# of the run and the next one is used.
+_COPY_METHODS = ["copy_file_range", "sendfile", "userspace"]
+_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
+_copy_lock = threading.Lock()
+
+def _copy_file_range(in_fd, out_fd, count):
+    copied = 0
+    while copied < count:
+        n = os.copy_file_range(in_fd, out_fd, count - copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+def _sendfile(in_fd, out_fd, count):
+    copied = 0
+    while copied < count:
+        n = os.sendfile(out_fd, in_fd, copied, count - copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+def _userspace(in_fd, out_fd, count):
+    with open(in_fd, "rb", closefd=False) as infile, open(out_fd, "wb", closefd=False) as outfile:
+        shutil.copyfileobj(infile, outfile)
+        outfile.flush()
+        return infile.tell()
+
+_COPY_FUNCS = {
+    "copy_file_range": _copy_file_range,
+    "sendfile": _sendfile,
+    "userspace": _userspace,
+}
+
+def _drop_method(method):
+    with _copy_lock:
+        if method in _COPY_METHODS and len(_COPY_METHODS) > 1:
+            _COPY_METHODS.remove(method)
+
+def append_file(in_path, out_fd):
+    """
+    Append the whole of `in_path` at the current position of `out_fd`.
+    Returns the number of bytes copied.
+    """
+    with open(in_path, "rb") as infile:
+        in_fd = infile.fileno()
+        count = os.fstat(in_fd).st_size
+        start = os.lseek(out_fd, 0, os.SEEK_CUR)
+        while True:
+            method = _COPY_METHODS[0]
+            if method != "userspace" and not hasattr(os, method):
+                _drop_method(method)
+                continue
+            try:
+                return _COPY_FUNCS[method](in_fd, out_fd, count)
+            except OSError as e:
+                if e.errno not in _FALLBACK_ERRNOS or method == "userspace":
+                    raise
+                # rewind both sides and retry with the next primitive
+                _drop_method(method)
+                os.lseek(in_fd, 0, os.SEEK_SET)
+                os.lseek(out_fd, start, os.SEEK_SET)
+                os.ftruncate(out_fd, start)
+
+def combine_one_timestep(timestep, files, output_dir, verify=True):
+    """
+    Concatenate the per-PE files of one timestep, in rank order.
+    """
+    # Sort files by PE rank to ensure correct concatenation order
+    files = sorted(files, key=lambda x: x['rank'])
+
+    output_filename = f"checkpoint_ts{timestep:04d}.txt"
+    output_filepath = os.path.join(output_dir, output_filename)
+
+    print(f"Combining {len(files)} files for timestep {timestep} into {output_filepath}...")
+
+    expected = 0
+    fd = os.open(output_filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        for file_info in files:
+            expected += append_file(file_info['path'], fd)
+    except IOError:
+        os.close(fd)
+        # remove the partially created output file
+        os.remove(output_filepath)
+        raise
+    os.close(fd)
+
+    # Verify size (sum of input sizes should match output size)
+    if verify:
+        total_input_size = sum(os.path.getsize(f['path']) for f in files)
+        output_size = os.path.getsize(output_filepath)
+        if total_input_size != output_size or expected != output_size:
+            raise IOError(f"Size mismatch for timestep {timestep}. Expected {total_input_size}, got {output_size}.")
+
+    return output_filepath
+
+def manifest_one_timestep(timestep, files, output_dir, verify=True):
+    """
+    Describe the combined checkpoint of one timestep without copying it.
+    """
+    files = sorted(files, key=lambda x: x['rank'])
+
+    output_filename = f"checkpoint_ts{timestep:04d}{MANIFEST_EXT}"
+    output_filepath = os.path.join(output_dir, output_filename)
+
+    print(f"Indexing {len(files)} files for timestep {timestep} into {output_filepath}...")
+    size = write_manifest(output_filepath, timestep, [f['path'] for f in files])
+
+    # Verify the manifest: every part still on disk with its recorded length,
+    # parts back to back, and the virtual size equal to the sum of the inputs
+    if verify:
+        manifest = read_manifest(output_filepath)
+        total_input_size = sum(os.path.getsize(f['path']) for f in files)
+        offset = 0
+        for part in manifest["parts"]:
+            if not os.path.isfile(part["path"]):
+                os.remove(output_filepath)
+                raise IOError(f"Timestep {timestep}: manifest references missing file {part['path']}.")
+            if part["offset"] != offset or os.path.getsize(part["path"]) != part["length"]:
+                os.remove(output_filepath)
+                raise IOError(f"Timestep {timestep}: manifest entry for {part['path']} does not match the file.")
+            offset += part["length"]
+        if total_input_size != offset or size != offset or manifest["size"] != offset:
+            os.remove(output_filepath)
+            raise IOError(f"Size mismatch for timestep {timestep}. Expected {total_input_size}, got {manifest['size']}.")
+
+    return output_filepath
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="combine miniAMR per-PE dump files into per-timestep checkpoints.")
     parser.add_argument("input_dir", help="Directory containing the dump_ts*_pe*.txt files.")
     parser.add_argument("output_dir", help="Directory to save the combined checkpoint_ts*.txt files.")
+    parser.add_argument("--workers", type=int, default=None, help="Timesteps combined concurrently.")
+    parser.add_argument("--no-verify", action="store_true", help="Skip the output size check.")
+    parser.add_argument("--virtual", action="store_true", help="Write manifests instead of copying data.")
 
     args = parser.parse_args()
 
-    combine_timestep_files(args.input_dir, args.output_dir)
\ No newline at end of file
+    combine_timestep_files(args.input_dir, args.output_dir, args.workers, not args.no_verify, args.virtual)
\ No newline at end of file
@@ -1,9 +1,11 @@
 import os
-import re
+import sys
 import matplotlib.pyplot as plt
-import matplotlib.cm as cm
 import numpy as np
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from timing_logs import load_sweep
+
 # Base directory
 base_dir = '.'
 
@@ -12,51 +14,30 @@ r_dirs = sorted([d for d in os.listdir(base_dir) if os.path.isdir(os.path.join(b
 
 # Assign consistent colors
 num_colors = len(r_dirs)
-colors = cm.get_cmap('Paired', num_colors)  # Or Set1, Dark2, etc.
+colors = plt.get_cmap('Paired', num_colors)  # Or Set1, Dark2, etc.
 
 # First, parse all data and find global max y for syncing axes
+# (logs are parsed once and cached; unchanged logs are not re-read)
+timings = load_sweep(base_dir)
 amr_data = {}
 dedup_data = {}
-global_max_y = 0
+global_max_y = timings['seconds'].max() if not timings.empty else 0
 
 for idx, r_dir in enumerate(r_dirs):
     color = colors(idx)
+    run = timings[timings['run'] == r_dir]
 
     # AMR refine times
-    amr_refine_path = os.path.join(base_dir, r_dir, 'amr', 'refine_times.txt')
-    if os.path.exists(amr_refine_path):
-        amr_timesteps = []
-        amr_times = []
-        with open(amr_refine_path, 'r') as f:
-            for line in f:
-                match = re.search(r'Refinement at timestep (\d+) took ([\d\.]+) seconds', line)
-                if match:
-                    timestep = int(match.group(1))
-                    time = float(match.group(2))
-                    amr_timesteps.append(timestep)
-                    amr_times.append(time)
-                    if time > global_max_y:
-                        global_max_y = time
-        amr_data[r_dir] = (amr_timesteps, amr_times, color)
+    amr = run[run['kind'] == 'refine']
+    if not amr.empty:
+        amr_data[r_dir] = (amr['step'].tolist(), amr['seconds'].tolist(), color)
     else:
         print(f"Skipping {r_dir} (no amr/refine_times.txt)")
 
     # Dedup times
-    dedup_refine_path = os.path.join(base_dir, r_dir, 'dedup', 'dedup_times.txt')
-    if os.path.exists(dedup_refine_path):
-        dedup_timesteps = []
-        dedup_times = []
-        with open(dedup_refine_path, 'r') as f:
-            for line in f:
-                match = re.search(r'Deduplication at current_id (\d+) took ([\d\.]+) seconds', line)
-                if match:
-                    timestep = int(match.group(1))
-                    time = float(match.group(2))
-                    dedup_timesteps.append(timestep)
-                    dedup_times.append(time)
-                    if time > global_max_y:
-                        global_max_y = time
-        dedup_data[r_dir] = (dedup_timesteps, dedup_times, color)
+    dedup = run[run['kind'] == 'dedup']
+    if not dedup.empty:
+        dedup_data[r_dir] = (dedup['step'].tolist(), dedup['seconds'].tolist(), color)
     else:
         print(f"Skipping {r_dir} (no dedup/dedup_times.txt)")
 
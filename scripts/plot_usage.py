@@ -1,52 +1,47 @@
 import os
+import sys
 import matplotlib.pyplot as plt
 
-# Define the methods and their usage.txt paths
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from storage_usage import load_usage, USAGE_FILE, LEGACY_FILE
+
+# Codec whose compressed dumps are plotted as 'compressed'
+codec = 'zlib'
+
+# Define the methods and their usage directories (usage.npz, or a legacy usage.txt)
 methods = {
-    'dedup': 'dedup/usage.txt',
-    'baseline': 'baseline/usage.txt',
-    'amr': 'amr/usage.txt'
+    'dedup': 'dedup',
+    'baseline': 'baseline',
+    'amr': 'amr',
+    # optional: the compressed/<codec> directory of Simulation(compression=..., compression_write=True);
+    # run `python storage_usage.py compressed/<codec>` on it first to write its usage.npz
+    'compressed': os.path.join('compressed', codec)
 }
 
 # Define placeholder names
 placeholders = {
     'dedup': 'Deduplication',
     'baseline': 'Full Checkpoint',
-    'amr': 'AMR'
+    'amr': 'AMR',
+    'compressed': 'Compression'
 }
 
 # Desired plotting order (based on placeholder order you want)
 # "baseline" -> "dedup" -> "amr" so Method 2 is on top
-plot_order = ['baseline', 'dedup', 'amr']
+plot_order = ['baseline', 'compressed', 'dedup', 'amr']
 
 usage_data = {}
 
-# Parse each usage.txt
+# Load each method's usage (per-timestep totals are precomputed)
 for method, path in methods.items():
-    timesteps = []
-    sizes = []
-    total_usage = 0
-
-    with open(path, 'r') as f:
-        lines = f.readlines()
-
-    for line in lines:
-        parts = line.strip().split()
-        if len(parts) < 9:
-            continue  # Skip lines like "total 94644"
-        size = int(parts[4])
-        filename = parts[8]
-
-        if filename.startswith("dump_ts") and "_pe" in filename:
-            timestep_part = filename.split("_pe")[0]  # "dump_ts0000"
-            timestep = int(timestep_part.replace("dump_ts", ""))
-            timesteps.append(timestep)
-            sizes.append(size)
-            total_usage += size
+    if method == 'compressed' and not any(os.path.exists(os.path.join(path, f)) for f in (USAGE_FILE, LEGACY_FILE)):
+        continue
+    usage = load_usage(path)
+    total_usage = int(usage['cum_size'][-1]) if len(usage['ts']) else 0
 
     usage_data[method] = {
-        'timesteps': timesteps,
-        'sizes': sizes,
+        'timesteps': usage['ts'].tolist(),
+        'sizes': usage['ts_size'].tolist(),
         'total': total_usage
     }
 
@@ -55,6 +50,8 @@ for method, path in methods.items():
 # Plot
 plt.figure(figsize=(10, 6))
 for method in plot_order:  # <- Plot in specified order
+    if method not in usage_data:
+        continue
     data = usage_data[method]
     sorted_pairs = sorted(zip(data['timesteps'], data['sizes']))
     timesteps_sorted, sizes_sorted = zip(*sorted_pairs)
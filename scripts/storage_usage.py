@@ -0,0 +1,187 @@
+import os
+import re
+import sys
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# =========================================================
+# Storage accounting for checkpoint directories
+#
+# Walks a checkpoint directory with os.scandir, stats the dump files in
+# parallel and stores one record per file (timestep, pe, apparent size,
+# allocated bytes) in usage.npz, together with per-timestep and cumulative
+# totals so plotting scripts do not have to recompute them.
+# Allocated bytes come from st_blocks, so sparse files are accounted for.
+#
+# Only data files count: per-rank dumps (dump_tsN_peM.bin/.txt and their dedup
+# .tree.incr_diff output), combined checkpoints (checkpoint_tsN.txt), simulator
+# dumps (step_N.dat, step_N.delta) and their compressed copies (<name>.zlib,
+# .lzma, .bz2). The .meta/.chunks sidecars next to the dumps are not data.
+# When a timestep has per-rank dumps, a combined checkpoint of the same
+# timestep duplicates them and is left out.
+# =========================================================
+
+DUMP_PATTERN = re.compile(r"(?:(?:dump|checkpoint)_ts|step_)(\d+)(?:_pe(\d+))?"
+                          r"\.(?:bin|txt|dat|delta)(?:\.tree\.incr_diff)?(?:\.(?:zlib|lzma|bz2))?$")
+SIDECAR_SUFFIXES = (".meta", ".chunks")
+USAGE_FILE   = "usage.npz"
+LEGACY_FILE  = "usage.txt"
+
+RECORD_DTYPE = np.dtype([
+    ("timestep",  "<i8"),
+    ("pe",        "<i8"),  # -1 for combined checkpoints
+    ("size",      "<i8"),  # apparent size (st_size)
+    ("allocated", "<i8"),  # bytes on disk (st_blocks * 512)
+])
+
+def match_dump(name, pattern=DUMP_PATTERN):
+    """
+    (timestep, pe) of a data file name (pe -1 for combined files), None otherwise.
+    """
+    if name.endswith(SIDECAR_SUFFIXES):
+        return None
+    m = pattern.match(name)
+    if m is None:
+        return None
+    return int(m.group(1)), int(m.group(2)) if m.group(2) is not None else -1
+
+def drop_combined(records, names=None):
+    """
+    Records without the combined checkpoints (pe -1) of timesteps that also
+    have per-rank dumps; `names` are filtered alongside when given.
+    """
+    ranked = np.unique(records["timestep"][records["pe"] >= 0])
+    keep = ~((records["pe"] < 0) & np.isin(records["timestep"], ranked))
+    return (records[keep], names[keep]) if names is not None else records[keep]
+
+def _stat_entries(entries):
+    records = []
+    for entry, timestep, pe in entries:
+        st = entry.stat(follow_symlinks=False)
+        allocated = st.st_blocks * 512 if hasattr(st, "st_blocks") else st.st_size
+        records.append((timestep, pe, st.st_size, allocated))
+    return records
+
+def scan_directory(directory, workers=8, pattern=DUMP_PATTERN):
+    """
+    Records (see RECORD_DTYPE) for every dump file in `directory`, sorted by
+    (timestep, pe), plus the matching file names.
+    """
+    entries = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            m = match_dump(entry.name, pattern)
+            if m and entry.is_file(follow_symlinks=False):
+                entries.append((entry, *m))
+
+    # stat calls dominate; spread them over a few threads
+    batch = max(1, -(-len(entries) // max(1, workers)))
+    batches = [entries[i:i + batch] for i in range(0, len(entries), batch)]
+    records = []
+    if batches:
+        with ThreadPoolExecutor(max_workers=len(batches)) as pool:
+            for part in pool.map(_stat_entries, batches):
+                records.extend(part)
+
+    names = np.array([e.name for e, _, _ in entries], dtype=str)
+    recs = np.array(records, dtype=RECORD_DTYPE)
+    order = np.lexsort((recs["pe"], recs["timestep"])) if len(recs) else np.zeros(0, dtype=np.int64)
+    return drop_combined(recs[order], names[order])
+
+def timestep_totals(records):
+    """
+    Per-timestep totals over all PEs, and their running sums.
+    """
+    ts, inverse = np.unique(records["timestep"], return_inverse=True)
+    size = np.bincount(inverse, weights=records["size"], minlength=len(ts)).astype(np.int64)
+    allocated = np.bincount(inverse, weights=records["allocated"], minlength=len(ts)).astype(np.int64)
+    return {
+        "ts": ts,
+        "ts_size": size,
+        "ts_allocated": allocated,
+        "cum_size": np.cumsum(size),
+        "cum_allocated": np.cumsum(allocated),
+    }
+
+def write_usage(filename, records, names=None):
+    totals = timestep_totals(records)
+    extra = {} if names is None else {"names": names}
+    np.savez(filename, **{k: records[k] for k in RECORD_DTYPE.names}, **totals, **extra)
+    return
+
+def parse_ls_listing(filename):
+    """
+    Records from a captured `ls -l` listing (the legacy usage.txt files).
+    Allocated bytes are unknown there and reported equal to the size.
+    """
+    records = []
+    with open(filename, 'r') as f:
+        for line in f:
+            parts = line.strip().split()
+            if len(parts) < 9:
+                continue  # Skip lines like "total 94644"
+            m = match_dump(parts[8])
+            if m:
+                size = int(parts[4])
+                records.append((*m, size, size))
+    recs = np.array(records, dtype=RECORD_DTYPE)
+    return drop_combined(recs[np.lexsort((recs["pe"], recs["timestep"]))]) if len(recs) else recs
+
+def load_usage(method_dir):
+    """
+    Usage of one method directory (e.g. r3/dedup) as a dict with the per-file
+    records and the per-timestep totals. Reads usage.npz when present and
+    falls back to the legacy usage.txt listing.
+    """
+    path = os.path.join(method_dir, USAGE_FILE)
+    if os.path.exists(path):
+        with np.load(path) as data:
+            usage = {k: data[k] for k in data.files}
+        usage["records"] = np.rec.fromarrays([usage[k] for k in RECORD_DTYPE.names], dtype=RECORD_DTYPE)
+        return usage
+
+    legacy = os.path.join(method_dir, LEGACY_FILE)
+    if not os.path.exists(legacy):
+        raise FileNotFoundError(f"No {USAGE_FILE} or {LEGACY_FILE} in {method_dir}")
+    records = parse_ls_listing(legacy)
+    usage = timestep_totals(records)
+    usage["records"] = records
+    return usage
+
+def collect(checkpoint_dirs, output_dirs=None, workers=8):
+    """
+    Scan several checkpoint directories concurrently and write usage.npz for
+    each (into the matching output directory, or the checkpoint directory).
+    """
+    if output_dirs is None:
+        output_dirs = checkpoint_dirs
+
+    def one(args):
+        src, dst = args
+        records, names = scan_directory(src, workers)
+        os.makedirs(dst, exist_ok=True)
+        write_usage(os.path.join(dst, USAGE_FILE), records, names)
+        return src, records
+
+    with ThreadPoolExecutor(max_workers=max(1, len(checkpoint_dirs))) as pool:
+        results = list(pool.map(one, zip(checkpoint_dirs, output_dirs)))
+
+    for src, records in results:
+        print(f"{src}: {len(records)} files, {records['size'].sum() / (1024**2):.2f} MB "
+              f"({records['allocated'].sum() / (1024**2):.2f} MB allocated)")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record checkpoint storage usage into usage.npz.")
+    parser.add_argument("checkpoint_dirs", nargs="+", help="Directories holding dump/checkpoint files.")
+    parser.add_argument("-o", "--output-dirs", nargs="+", default=None,
+                        help="Where to write usage.npz (one per checkpoint dir; default: alongside the dumps).")
+    parser.add_argument("--workers", type=int, default=8, help="Threads used to stat files per directory.")
+    args = parser.parse_args()
+
+    if args.output_dirs is not None and len(args.output_dirs) != len(args.checkpoint_dirs):
+        print("Error: --output-dirs needs one entry per checkpoint directory.")
+        sys.exit(1)
+
+    collect(args.checkpoint_dirs, args.output_dirs, args.workers)
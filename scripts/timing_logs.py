@@ -0,0 +1,101 @@
+import os
+import re
+import hashlib
+import numpy as np
+import pandas as pd
+
+# =========================================================
+# Timing log ingest
+#
+# Parses the "Refinement at timestep N took X seconds" (amr/refine_times.txt)
+# and "Deduplication at current_id N took X seconds" (dedup/dedup_times.txt)
+# logs in one regex pass over the whole file, and caches the parsed columns as
+# an .npz keyed by the log's path, mtime and size.
+# =========================================================
+
+PATTERNS = {
+    "refine": re.compile(rb"Refinement at timestep (\d+) took ([\d\.]+) seconds"),
+    "dedup":  re.compile(rb"Deduplication at current_id (\d+) took ([\d\.]+) seconds"),
+}
+
+# Where each kind of log lives inside a run directory (r2, r3, ...)
+SWEEP_LOGS = {
+    "refine": os.path.join("amr", "refine_times.txt"),
+    "dedup":  os.path.join("dedup", "dedup_times.txt"),
+}
+
+CACHE_DIR = os.environ.get(
+    "TIMING_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "dynamic_chunking", "timing_logs"),
+)
+
+def guess_kind(path):
+    name = os.path.basename(path)
+    if name.startswith("refine"):
+        return "refine"
+    if name.startswith("dedup"):
+        return "dedup"
+    raise ValueError(f"Cannot tell the log kind of {path}; pass kind='refine' or kind='dedup'.")
+
+def parse_timing_log(path, kind):
+    """
+    Parse a timing log. Returns (step, seconds) numpy arrays.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    matches = PATTERNS[kind].findall(data)
+    if not matches:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    cols = np.array(matches)
+    return cols[:, 0].astype(np.int64), cols[:, 1].astype(np.float64)
+
+def _cache_file(path, kind):
+    key = hashlib.sha1(f"{os.path.abspath(path)}|{kind}".encode()).hexdigest()
+    return os.path.join(CACHE_DIR, key + ".npz")
+
+def load_timing_log(path, kind=None, use_cache=True):
+    """
+    Timing log as a DataFrame with columns step and seconds.
+    The log is only re-parsed when its mtime or size changed.
+    """
+    if kind is None:
+        kind = guess_kind(path)
+
+    st = os.stat(path)
+    cache = _cache_file(path, kind)
+    if use_cache and os.path.exists(cache):
+        with np.load(cache) as c:
+            if int(c["mtime_ns"]) == st.st_mtime_ns and int(c["size"]) == st.st_size:
+                return pd.DataFrame({"step": c["step"], "seconds": c["seconds"]})
+
+    step, seconds = parse_timing_log(path, kind)
+    if use_cache:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = cache + f".{os.getpid()}.tmp.npz"
+        np.savez(tmp, mtime_ns=st.st_mtime_ns, size=st.st_size, step=step, seconds=seconds)
+        os.replace(tmp, cache)
+    return pd.DataFrame({"step": step, "seconds": seconds})
+
+def load_sweep(base_dir=".", prefix="r", kinds=("refine", "dedup")):
+    """
+    Every timing log of a refinement sweep as one tidy DataFrame:
+    columns run (e.g. "r3"), kind ("refine"/"dedup"), step, seconds.
+    """
+    runs = sorted(
+        d for d in os.listdir(base_dir)
+        if os.path.isdir(os.path.join(base_dir, d)) and d.startswith(prefix)
+    )
+    frames = []
+    for run in runs:
+        for kind in kinds:
+            path = os.path.join(base_dir, run, SWEEP_LOGS[kind])
+            if not os.path.exists(path):
+                continue
+            df = load_timing_log(path, kind)
+            df.insert(0, "kind", kind)
+            df.insert(0, "run", run)
+            frames.append(df)
+
+    if not frames:
+        return pd.DataFrame({"run": [], "kind": [], "step": [], "seconds": []})
+    return pd.concat(frames, ignore_index=True)
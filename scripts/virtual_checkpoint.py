@@ -0,0 +1,164 @@
+import os
+import io
+import sys
+import json
+import mmap
+import bisect
+
+# =========================================================
+# Virtual combined checkpoints
+#
+# Instead of concatenating the per-PE dumps of a timestep, a manifest lists the
+# pieces of the combined stream in order:
+#   {"timestep": 3, "size": 1234,
+#    "parts": [{"path": "dump_ts0003_pe000000.txt", "offset": 0, "length": 512}, ...]}
+# Paths are stored relative to the manifest so the directories can be moved
+# together. VirtualCheckpoint reads a manifest back as one seekable file.
+# =========================================================
+
+MANIFEST_EXT = ".manifest"
+
+def write_manifest(manifest_path, timestep, paths):
+    """
+    Write the manifest for `paths` (already in rank order). Returns the virtual size.
+    """
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    parts = []
+    offset = 0
+    for path in paths:
+        length = os.path.getsize(path)
+        parts.append({
+            "path": os.path.relpath(os.path.abspath(path), base),
+            "offset": offset,
+            "length": length,
+        })
+        offset += length
+
+    with open(manifest_path, "w") as f:
+        json.dump({"timestep": timestep, "size": offset, "parts": parts}, f)
+    return offset
+
+def read_manifest(manifest_path):
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    for part in manifest["parts"]:
+        part["path"] = os.path.join(base, part["path"])
+    return manifest
+
+class VirtualCheckpoint(io.RawIOBase):
+    """
+    Read-only, seekable file object over the parts listed in a manifest.
+
+    Reads go straight from the part files into the caller's buffer; nothing is
+    concatenated. iter_segments() exposes the parts as memory-mapped memoryviews
+    for consumers that can process a stream of buffers.
+    """
+
+    def __init__(self, manifest_path, verify=True):
+        super().__init__()
+        self.manifest = read_manifest(manifest_path)
+        self.name     = manifest_path
+        self.parts    = self.manifest["parts"]
+        self.size     = self.manifest["size"]
+        self.starts   = [p["offset"] for p in self.parts]
+        self.pos      = 0
+        self.files    = {}
+
+        if verify:
+            for p in self.parts:
+                actual = os.path.getsize(p["path"])
+                if actual != p["length"]:
+                    raise IOError(f"{p['path']} is {actual} bytes, manifest expects {p['length']}.")
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self.pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError("Negative seek position")
+        self.pos = pos
+        return self.pos
+
+    def __part_file(self, index):
+        f = self.files.get(index)
+        if f is None:
+            f = open(self.parts[index]["path"], "rb", buffering=0)
+            self.files[index] = f
+        return f
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        want = min(len(view), max(0, self.size - self.pos))
+        done = 0
+        index = bisect.bisect_right(self.starts, self.pos) - 1
+        while done < want:
+            part = self.parts[index]
+            inner = self.pos - part["offset"]
+            n = min(part["length"] - inner, want - done)
+            if n > 0:
+                f = self.__part_file(index)
+                f.seek(inner)
+                got = f.readinto(view[done:done + n])
+                if not got:
+                    raise IOError(f"Unexpected end of {part['path']}")
+                done += got
+                self.pos += got
+                if got < n:
+                    continue
+            index += 1
+        return done
+
+    def iter_segments(self):
+        """
+        Yield the combined stream as one memoryview per non-empty part.
+        """
+        for part in self.parts:
+            if part["length"] == 0:
+                continue
+            with open(part["path"], "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    view = memoryview(mm)[:part["length"]]
+                    try:
+                        yield view
+                    finally:
+                        view.release()
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files.clear()
+        super().close()
+
+def open_checkpoint(path):
+    """
+    Open a combined checkpoint, virtual (manifest) or physical, for binary reading.
+    """
+    if path.endswith(MANIFEST_EXT):
+        return io.BufferedReader(VirtualCheckpoint(path))
+    return open(path, "rb")
+
+if __name__ == "__main__":
+    # Materialize a virtual checkpoint, e.g. for tools that need a real file
+    if len(sys.argv) != 3:
+        print("Usage: python virtual_checkpoint.py <manifest> <output_file>")
+        sys.exit(1)
+
+    with VirtualCheckpoint(sys.argv[1]) as src, open(sys.argv[2], "wb") as dst:
+        for segment in src.iter_segments():
+            dst.write(segment)
+    print(f"Wrote {sys.argv[2]}")